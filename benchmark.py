@@ -0,0 +1,293 @@
+"""Benchmarks for the inventory system.
+
+Generates a seeded, synthetic dealership at several sizes and times the operations
+users wait on: loading, saving an edit, VIN lookups, bulk import, the reports and
+their PDFs. Everything runs headless in a scratch directory by calling the
+functions in inventory.py directly.
+
+    python benchmark.py                      # 1k and 10k vehicles
+    python benchmark.py --scales 1000,10000,100000 --storage sqlite
+    python benchmark.py --save-baseline      # store these results as the baseline
+"""
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import inventory as inv
+
+DEFAULT_SCALES = [1000, 10000]
+DEFAULT_SEED = 1234
+RESULTS_FILE = "benchmark_results.json"
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.20  # Slower than the baseline by more than this fraction counts as a regression
+LOOKUPS = 1000  # VIN lookups per timing
+
+MAKES = {
+    "Ford": ["F-150", "Escape", "Explorer", "Mustang", "Ranger"],
+    "Toyota": ["Camry", "Corolla", "RAV4", "Tacoma", "Highlander"],
+    "Honda": ["Civic", "Accord", "CR-V", "Pilot", "Odyssey"],
+    "Chevrolet": ["Silverado", "Malibu", "Equinox", "Tahoe", "Colorado"],
+    "Nissan": ["Altima", "Sentra", "Rogue", "Frontier", "Pathfinder"],
+    "Subaru": ["Outback", "Forester", "Impreza", "Crosstrek", "Ascent"],
+}
+MODEL_TYPES = {
+    "F-150": "Truck", "Ranger": "Truck", "Tacoma": "Truck", "Silverado": "Truck", "Colorado": "Truck", "Frontier": "Truck",
+    "Mustang": "Coupe", "Odyssey": "Van",
+    "Escape": "SUV", "Explorer": "SUV", "RAV4": "SUV", "Highlander": "SUV", "CR-V": "SUV", "Pilot": "SUV",
+    "Equinox": "SUV", "Tahoe": "SUV", "Rogue": "SUV", "Pathfinder": "SUV", "Forester": "SUV", "Crosstrek": "SUV",
+    "Ascent": "SUV", "Outback": "Wagon",
+    "Camry": "Sedan", "Corolla": "Sedan", "Civic": "Sedan", "Accord": "Sedan", "Malibu": "Sedan",
+    "Altima": "Sedan", "Sentra": "Sedan", "Impreza": "Sedan",
+}
+FAULTS = ["dented bumper", "cracked windshield", "worn tires", "check engine light", "scratched paint",
+          "torn seat", "weak battery", "brake noise", "oil leak", "broken mirror"]
+EXPENSES = ["tires", "detailing", "brake pads", "windshield", "oil change", "paint repair", "battery", "inspection"]
+VIN_CHARS = "ABCDEFGHJKLMNPRSTUVWXYZ0123456789"  # VINs never use I, O or Q
+
+# Synthetic data
+def generate_dataset(vehicles, seed=DEFAULT_SEED):
+    """Build inventory, sold-car, expenditure and user rows; the same seed gives the same data."""
+    rng = random.Random(seed)
+    start = datetime(2023, 1, 1)
+    vins = set()
+    inventory_rows, sold_rows, expenditure_rows = [], [], []
+    for stock_number in range(1, vehicles + 1):
+        vin = "".join(rng.choice(VIN_CHARS) for _ in range(17))
+        while vin in vins:
+            vin = "".join(rng.choice(VIN_CHARS) for _ in range(17))
+        vins.add(vin)
+        name = rng.choice(list(MAKES))
+        model = rng.choice(MAKES[name])
+        year = rng.randint(2005, 2024)
+        price = round(rng.uniform(4000, 45000) * (1 + (year - 2005) / 20), 2)
+        car = {
+            "stock_number": stock_number,
+            "Name": name,
+            "Model": model,
+            "Type": MODEL_TYPES[model],
+            "Year": year,
+            "VIN": vin,
+            "Mileage": rng.randint(1000, 12000) * (2025 - year),
+            "Faults": rng.sample(FAULTS, rng.choice([0, 0, 1, 1, 2, 3])),
+            "Price": price,
+            "Sold": rng.random() < 0.3,
+        }
+        inventory_rows.append(car)
+
+        spent = 0.0
+        for _ in range(rng.choice([0, 1, 1, 2, 3])):
+            amount = round(rng.uniform(40, 1500), 2)
+            spent += amount
+            expenditure_rows.append({"Type": "Car", "VIN": vin, "Amount": amount, "Description": rng.choice(EXPENSES)})
+        if car["Sold"]:
+            sales_price = round(price * rng.uniform(1.05, 1.3), 2)
+            tax = sales_price * inv.SALES_TAX
+            sale_date = start + timedelta(days=rng.randint(0, 700), minutes=rng.randint(0, 600))
+            sold_rows.append({
+                **car,
+                "SalesPrice": sales_price,
+                "Tax": tax,
+                "Profit": sales_price - price - spent - tax,
+                "Expenditures": spent,
+                "LandedCost": price + spent,
+                "SaleDate": sale_date.isoformat(timespec="seconds"),
+            })
+    for _ in range(max(1, vehicles // 50)):
+        expenditure_rows.append({"Type": "Miscellaneous", "Amount": round(rng.uniform(50, 5000), 2),
+                                 "Description": rng.choice(["rent", "utilities", "advertising", "payroll"])})
+    users = {f"user{i}": inv.hash_password(f"password{i}") for i in range(20)}
+    return {"inventory": inventory_rows, "sold_cars": sold_rows, "expenditures": expenditure_rows, "users": users}
+
+def generate_import_rows(dataset, rows, seed=DEFAULT_SEED):
+    """A supplier feed: half new vehicles, half price changes to cars already on the lot."""
+    rng = random.Random(seed + 1)
+    fresh = generate_dataset(rows - rows // 2, seed + 2)["inventory"]
+    feed = [{key: car[key] for key in ["stock_number", "Name", "Model", "Type", "Year", "VIN", "Mileage", "Price"]}
+            for car in fresh]
+    for car in rng.sample(dataset["inventory"], rows // 2):
+        feed.append({"VIN": car["VIN"], "Price": round(car["Price"] * rng.uniform(0.9, 1.1), 2)})
+    rng.shuffle(feed)
+    return feed
+
+# Timing
+def measure(fn, repeat):
+    """Run fn repeat times and return the best and median wall-clock seconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return {"best": min(times), "median": statistics.median(times), "runs": repeat}
+
+@contextlib.contextmanager
+def timer(results, name, repeat):
+    """Time a with-block as a single run."""
+    started = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - started
+    results[name] = {"best": elapsed, "median": elapsed, "runs": repeat}
+
+def cold_load():
+    """Drop everything held in memory and load it back from storage."""
+    inv.storage = inv.STORAGE_ENGINES[inv.storage.name]()
+    inv.file_signatures.clear()
+    inv.journal_seq = 0
+    inv.load_data()
+
+def run_scale(vehicles, storage_name, seed, repeat, directory):
+    """Write a dataset of the given size into directory and time each operation on it."""
+    dataset = generate_dataset(vehicles, seed)
+    inv.storage = inv.STORAGE_ENGINES[storage_name]()
+    results = {}
+
+    with timer(results, "write dataset", 1):
+        inv.storage.save(dataset["inventory"], dataset["sold_cars"], dataset["users"], dataset["expenditures"])
+    inv.load_data()
+    inv.save_sales_aggregates()  # So cold loads measure reading the totals, not rebuilding them
+
+    results["cold load"] = measure(cold_load, repeat)
+
+    rng = random.Random(seed + 3)
+    vins = [car["VIN"] for car in rng.sample(dataset["inventory"], min(LOOKUPS, vehicles))]
+    results["VIN lookup (full)"] = measure(lambda: [inv.find_cars(vin) for vin in vins], repeat)
+    results["VIN lookup (last 6)"] = measure(lambda: [inv.find_cars(vin[-6:]) for vin in vins], repeat)
+    results["search (type, year, mileage, price, unsold)"] = measure(
+        lambda: inv.CarQuery().where("Type", "SUV").between("Year", 2018, 2021).between("Mileage", high=80000)
+                   .between("Price", high=20000).unsold().order_by("Price").cars(), repeat)
+
+    # Reports from print_reports and the expenditure report
+    def inventory_report():
+        total_value = sum(car.get("Price", 0.0) for car in inv.current_inventory())
+        inv.get_page(inv.current_inventory(), 0, inv.PAGE_SIZE)
+        return total_value
+    car = inv.find_cars(vins[0])[0]
+    results["report: inventory"] = measure(inventory_report, repeat)
+    results["report: VIN"] = measure(lambda: inv.vin_report_lines(car), repeat)
+    results["report: sales"] = measure(inv.sales_report_lines, repeat)
+    results["report: audit sales totals"] = measure(inv.audit_sales_aggregates, repeat)
+    results["report: expenditure rollup"] = measure(inv.expenditure_rollup, repeat)
+
+    results["pdf: VIN report"] = measure(
+        lambda: inv.save_report_to_pdf(f"Report for VIN {car['VIN']}", inv.vin_report_lines(car), "vin_report.pdf"),
+        repeat)
+    results["pdf: inventory"] = measure(
+        lambda: inv.write_table_pdf("Inventory Report", inv.INVENTORY_COLUMNS, inv.current_inventory(),
+                                    "inventory_report.pdf", total_columns=("Price",)), repeat)
+    results["pdf: sales"] = measure(
+        lambda: inv.write_table_pdf("Sales Summary Report", inv.SALES_COLUMNS, inv.current_sold_cars(),
+                                    "sales_summary_report.pdf", total_columns=("SalesPrice", "Tax", "Profit"),
+                                    summary_lines=inv.sales_report_lines()), repeat)
+
+    # Writes last, since they change the data the reads above ran against
+    edits = iter(rng.sample(inv.inventory, min(repeat, vehicles)))
+    results["single-edit save"] = measure(
+        lambda: inv.update_vehicle(next(edits), {"Price": round(rng.uniform(4000, 45000), 2)}), repeat)
+    results["full save"] = measure(inv.save_data, 1)
+
+    import_file = os.path.join(directory, "import_feed.csv")
+    inv.pd.DataFrame(generate_import_rows(dataset, max(10, vehicles // 10), seed)).to_csv(import_file, index=False)
+    results["bulk import"] = measure(lambda: inv.import_vehicles(import_file), 1)
+    return results
+
+# Results and baseline
+def compare(results, baseline, tolerance):
+    """Print each timing next to its baseline and return the cases that got slower than allowed."""
+    regressions = []
+    base_results = baseline.get("results", {}) if baseline else {}
+    for setting in ("storage", "persistence", "seed"):
+        if baseline and baseline["meta"].get(setting) != results["meta"][setting]:
+            print(f"Warning: baseline {setting} is {baseline['meta'].get(setting)!r}, "
+                  f"this run used {results['meta'][setting]!r}; timings are not comparable.")
+    print(f"\n{'Case':<46}{'Vehicles':>10}{'Seconds':>12}{'Baseline':>12}{'Change':>10}")
+    for scale, cases in results["results"].items():
+        for name, timing in cases.items():
+            base = base_results.get(scale, {}).get(name)
+            line = f"{name:<46}{scale:>10}{timing['best']:>12.4f}"
+            if base and base["best"] > 0:
+                change = timing["best"] / base["best"] - 1
+                line += f"{base['best']:>12.4f}{change:>+10.1%}"
+                if change > tolerance:
+                    line += "  REGRESSION"
+                    regressions.append((scale, name, change))
+            print(line)
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the inventory system on synthetic data.")
+    parser.add_argument("--scales", default=",".join(str(scale) for scale in DEFAULT_SCALES),
+                        help="comma-separated vehicle counts (default: %(default)s)")
+    parser.add_argument("--storage", choices=sorted(inv.STORAGE_ENGINES), default=inv.STORAGE_ENGINE)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing; the best run is compared")
+    parser.add_argument("--output", default=RESULTS_FILE, help="where to write the results JSON")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="results JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before a case is flagged (default: %(default)s)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory with the generated files")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    scales = [int(scale) for scale in args.scales.split(",") if scale.strip()]
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+    results = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "storage": args.storage,
+            "persistence": inv.PERSISTENCE_MODE,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+
+    home = os.getcwd()
+    for vehicles in scales:
+        directory = tempfile.mkdtemp(prefix=f"inventory-bench-{vehicles}-")
+        os.chdir(directory)  # The data files are relative paths, so each scale gets its own copy
+        try:
+            print(f"Benchmarking {vehicles} vehicles ({args.storage}) in {directory}")
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                results["results"][str(vehicles)] = run_scale(vehicles, args.storage, args.seed, args.repeat, directory)
+        finally:
+            if inv.storage.name == "sqlite" and inv.storage.conn is not None:
+                inv.storage.conn.close()
+            os.chdir(home)
+            if not args.keep:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    baseline = None
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    elif baseline is None:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one.")
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,42 @@
 
 import os
 import time
-import pandas as pd
+
+STARTED_AT = time.perf_counter()  # For the startup timing breakdown
+
+import re
+import sys
+import ast
+import json
+import gzip
+import importlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from functools import partial, wraps
+from itertools import chain, islice
+from collections import OrderedDict, deque
+import gc
 import hashlib
+from array import array
+from bisect import bisect_left, bisect_right
 import getpass
-from fpdf import FPDF
-import Keyboard
+
+class LazyModule:
+    """Import a module the first time one of its attributes is used."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+pd = LazyModule("pandas")  # pandas takes longer to import than everything else put together
 
 # Constants
 SALES_TAX = 0.075
@@ -13,12 +44,115 @@ INVENTORY_FILE = "inventory.xlsx"
 SOLD_CARS_FILE = "sold_cars.xlsx"
 USERS_FILE = "users.xlsx"
 EXPENDITURES_FILE = "expenditures.xlsx"  # New file for expenditures
+JOURNAL_FILE = "inventory_journal.jsonl"  # Append-only log of changes made since the last snapshot
+JOURNAL_CHECKPOINT_FILE = "inventory_journal.checkpoint"  # Last journal entry folded into the snapshots
+SNAPSHOT_PENDING_FILE = "inventory_snapshot.pending"  # New workbooks ready to swap in, with the entry they fold up to
+JOURNAL_COMPACT_THRESHOLD = 5000  # Compact in the background once the journal holds this many entries
+PERSISTENCE_MODE = os.environ.get("INVENTORY_PERSISTENCE", "journal")  # "journal" or "snapshot"
+SQLITE_FILE = "inventory.db"
+SALES_SUMMARY_FILE = "sales_summary.json"  # Running sales totals by day, month, type and model
+CONFIG_FILE = "inventory_config.json"  # Optional local settings, e.g. {"storage": "sqlite"}
+REPORT_CACHE_ENTRIES = 64  # Rendered reports and PDFs kept in memory
+ARCHIVE_DIR = "archive"  # Monthly archives of old sales and settled expenditures, read only when needed
+ARCHIVE_INDEX_FILE = os.path.join(ARCHIVE_DIR, "index.json")  # Month -> number of records archived for it
+ARCHIVE_VINS_FILE = os.path.join(ARCHIVE_DIR, "vins.json")  # Normalized VIN -> months holding its sales
+
+def load_config():
+    if not os.path.exists(CONFIG_FILE):
+        return {}
+    with open(CONFIG_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+config = load_config()
+STORAGE_ENGINE = os.environ.get("INVENTORY_STORAGE", config.get("storage", "excel"))  # "excel" or "sqlite"
+REPORT_CACHE_BYTES = int(config.get("report_cache_mb", 64)) * 1024 * 1024  # Upper bound on their total size
+ARCHIVE_AFTER_DAYS = int(config.get("archive_after_days", 90))  # Sales older than this are archived
+SERVER_ADDRESS = config.get("server", "127.0.0.1:8765")  # Where serve listens and --connect looks by default
+SERVER_LOG_ENTRIES = 10000  # Recent changes the server keeps for clients to catch up from
+SERVER_MAX_REQUEST = 256 * 1024 * 1024  # Longest request line, e.g. a large import
+PAGE_SIZE = int(os.environ.get("INVENTORY_PAGE_SIZE", config.get("page_size", 10)))  # Vehicles per screen
+SORT_KEYS = ["Name", "Model", "Type", "Year", "Mileage", "Price"]  # Columns the inventory browser can sort by
+CAR_COLUMNS = ["stock_number", "Name", "Model", "Type", "Year", "VIN", "Mileage", "Faults", "Price", "Sold"]
+CAR_FIELDS = frozenset(CAR_COLUMNS)
+INTERNED_FIELDS = frozenset(["Name", "Model", "Type"])
+SALE_COLUMNS = ["SalesPrice", "Tax", "Profit", "Expenditures", "LandedCost", "SaleDate"]
+SALE_FIELDS = frozenset(SALE_COLUMNS)
+SALE_VEHICLE_ROW = "VehicleRow"  # Stored with a sale: the inventory row (seq) of the car it sold
+NUMERIC_FIELDS = ["Year", "Mileage", "Price"]  # Typed as numbers and range-indexed for search
+HASH_INDEX_FIELDS = ["Type", "Model", "Name", "Sold"]  # Exact-match search fields
+INDEXED_FIELDS = ("VIN",) + tuple(HASH_INDEX_FIELDS) + tuple(NUMERIC_FIELDS) + ("Faults",)
+BULK_INDEX_MIN = 1000  # Below this many new cars, inserting each into the sorted indexes beats re-sorting them
 
 # Initialize data
-inventory = []  # List of cars in inventory
-sold_cars = []  # List of sold cars
+inventory = []  # List of cars in inventory (Vehicle records)
+sold_cars = []  # List of sold cars (Sale records referencing their Vehicle)
 expenditures = []  # List to hold expenditure records
 users = {}  # Dictionary of users and hashed passwords
+sales_aggregates = {}  # Running sales totals, see new_sales_aggregates()
+
+# Journal state
+journal_seq = 0  # Sequence number of the last journal entry written or replayed
+journal_entries = 0  # Number of journal entries not yet folded into the snapshots
+journal_lock = threading.Lock()  # Serializes journal appends against compaction
+compaction_thread = None  # Background compaction, if one is running
+
+# VIN index
+vin_index = {}  # Normalized full VIN -> cars with that VIN
+vin_suffix_index = {}  # Last 6 VIN characters -> cars ending in them
+
+# Search indexes, keyed by each car's sequence number (its position in inventory order)
+car_seq = 0  # Last sequence number handed out
+cars_by_seq = {}  # Sequence number -> car
+hash_indexes = {field: {} for field in HASH_INDEX_FIELDS}  # Field -> search_value() -> set of sequence numbers
+range_indexes = {field: (array("d"), array("q")) for field in NUMERIC_FIELDS}  # Field -> (sorted values, their sequence numbers)
+fault_index = {}  # Normalized fault -> sequence numbers of the cars that have it
+fault_word_index = {}  # Word of a fault ("transmission") -> sequence numbers of the cars with such a fault
+
+# Expenditure index
+expenditures_by_vin = {}  # Normalized VIN -> that car's expenditure records
+expenditure_totals = {}  # Normalized VIN -> total spent on the car
+
+# Archive, loaded lazily
+archive_index = None  # Contents of ARCHIVE_INDEX_FILE, once read
+archive_vins = None  # Contents of ARCHIVE_VINS_FILE, once a VIN lookup needs it
+archive_months = {}  # Month -> its archived records, once read
+
+# Read cache
+file_signatures = {}  # Path -> (mtime, size) of each data file as of our last load or write
+
+# Data versions, for the report cache
+data_version = 0  # Increases on every change or reload
+data_versions = {"inventory": 0, "sold_cars": 0, "expenditures": 0}  # Dataset -> data_version of its last change
+CHANGE_DATASETS = {  # Journal operation -> datasets it changes
+    "add_car": ("inventory",),
+    "import_cars": ("inventory",),
+    "update_car": ("inventory",),
+    "sell_car": ("inventory", "sold_cars"),
+    "add_user": (),
+    "add_expenditure": ("expenditures",),
+}
+written_pdfs = {}  # Output path -> (cache key, file signature) of the PDF last written there
+
+# Startup state
+startup_timings = {}  # Step name -> seconds, for the most recent load
+data_ready = threading.Event()  # Cleared while preload_data() is loading in the background
+data_ready.set()
+preload_error = None  # Exception raised by the background load, re-raised by wait_for_data()
+
+# Batching
+pending_changes = None  # Changes held by batch_changes() until the batch is committed
+
+# Server state (the serve command)
+server_seq = 0  # Number of the last change the server committed
+server_log = deque(maxlen=SERVER_LOG_ENTRIES)  # (seq, JSON text) of the most recent changes
+server_snapshot = (None, b"")  # (server_seq, response) of the last snapshot sent, reused until the next change
+
+# Profiling state (off unless --profile or INVENTORY_PROFILE is given)
+profiling = False
+profile_output = None  # File the summary is written to instead of printed
+profile_calls = {}  # Function name -> duration of each call in seconds
+profile_bytes = {}  # Path -> [bytes read, bytes written]
+instrumented_names = []  # Functions and methods wrapped by enable_profiling()
 
 # Helper functions
 def clear_console():
@@ -34,24 +168,1840 @@ def show_transition(message="Loading..."):
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
+@contextmanager
+def gc_paused():
+    """Hold off the cyclic garbage collector while building many long-lived objects at once.
+
+    Each collection rescans every record already built, which made bulk loads quadratic-ish.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+# Instrumentation
+def instrumented(fn):
+    """Mark fn to be timed when profiling is enabled; until then it runs unwrapped, at no cost."""
+    instrumented_names.append(fn.__qualname__)
+    return fn
+
+def timed_call(fn, label):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile_calls.setdefault(label, []).append(time.perf_counter() - started)
+    return wrapper
+
+def count_bytes(path, read=0, written=0):
+    """Add to the bytes read from or written to a data file while profiling."""
+    if not (read or written):
+        return  # Missing files and empty writes are left out of the summary
+    totals = profile_bytes.setdefault(path, [0, 0])
+    totals[0] += read
+    totals[1] += written
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def enable_profiling(output=None):
+    """Swap every @instrumented function and method for a timed wrapper."""
+    global profiling, profile_output
+    if not profiling:
+        namespace = globals()
+        for label in instrumented_names:
+            if "." in label:
+                owner, name = label.split(".")
+                setattr(namespace[owner], name, timed_call(getattr(namespace[owner], name), label))
+            else:
+                namespace[label] = timed_call(namespace[label], label)
+    profiling = True
+    profile_output = output
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))]
+
+def profile_summary():
+    """Call and file statistics gathered so far, slowest total first."""
+    calls = {}
+    for name, durations in sorted(profile_calls.items(), key=lambda item: -sum(item[1])):
+        durations = sorted(durations)
+        calls[name] = {
+            "calls": len(durations),
+            "total_s": sum(durations),
+            "p50_ms": percentile(durations, 0.5) * 1000,
+            "p95_ms": percentile(durations, 0.95) * 1000,
+        }
+    files = {path: {"bytes_read": read, "bytes_written": written}
+             for path, (read, written) in sorted(profile_bytes.items())}
+    cache = {"hits": report_cache.hits, "misses": report_cache.misses,
+             "entries": len(report_cache.entries), "bytes": report_cache.size}
+    return {"calls": calls, "files": files, "report_cache": cache}
+
+def report_profile():
+    """Print the profile summary, or write it as JSON to the --profile-output file."""
+    summary = profile_summary()
+    if profile_output:
+        with open(profile_output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"Profile written to {profile_output}")
+        return
+    print("Profile:")
+    print(f"  {'Function':<36}{'Calls':>7}{'Total s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, stats in summary["calls"].items():
+        print(f"  {name:<36}{stats['calls']:>7}{stats['total_s']:>10.3f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}")
+    if summary["files"]:
+        print(f"\n  {'File':<36}{'Read':>12}{'Written':>12}")
+        for path, stats in summary["files"].items():
+            print(f"  {path:<36}{stats['bytes_read']:>12}{stats['bytes_written']:>12}")
+    cache = summary["report_cache"]
+    if cache["hits"] or cache["misses"]:
+        print(f"\n  Report cache: {cache['hits']} hits, {cache['misses']} misses, "
+              f"{cache['entries']} entries, {cache['bytes']} bytes")
+
+# Faults
+def normalize_faults(value):
+    """Faults as a list of trimmed, case-folded, distinct strings.
+
+    Accepts a list, the JSON the workbooks now store, the "['a', 'b']" text older
+    workbooks hold, or comma-separated text as typed at the prompts.
+    """
+    if value is None or value != value:
+        return []
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("["):
+            try:
+                value = json.loads(text)
+            except ValueError:
+                try:
+                    value = ast.literal_eval(text)
+                except (ValueError, SyntaxError):
+                    value = text.strip("[]").split(",")
+        else:
+            value = text.split(",")
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    faults = []
+    for item in value:
+        fault = " ".join(str(item).split()).casefold()
+        if fault and fault not in faults:
+            faults.append(sys.intern(fault))
+    return faults
+
+def fault_words(fault):
+    return set(re.findall(r"[^\W_]+", fault))
+
+def dump_faults(faults):
+    """Serialize faults for a workbook cell; JSON keeps commas and quotes inside a fault intact."""
+    return json.dumps(faults if isinstance(faults, list) else normalize_faults(faults))
+
+# Vehicle records
+class Vehicle:
+    """One car, held in slots rather than a per-car dict.
+
+    It supports the dict operations the rest of the program uses (car["VIN"],
+    car.get(), car.update(), dict(car)), so it works anywhere a car dict did.
+    Columns outside CAR_COLUMNS, e.g. from an imported feed, go in `extra`.
+    """
+
+    __slots__ = tuple(CAR_COLUMNS) + ("extra", "seq")
+
+    def __init__(self, fields=None):
+        self.extra = None
+        self.seq = None  # Set when the car is indexed, see index_car()
+        if fields:
+            self.update(fields)
+
+    def __getitem__(self, key):
+        if key in CAR_FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in CAR_FIELDS:
+            if key in INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)  # The same few makes, models and types repeat across the lot
+            elif key == "Faults":
+                value = normalize_faults(value)
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [field for field in CAR_COLUMNS if hasattr(self, field)] + list(self.extra or ())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def update(self, fields):
+        for key, value in fields.items():  # __setitem__ inlined: this builds every car on load
+            if key in CAR_FIELDS:
+                if key in INTERNED_FIELDS and type(value) is str:
+                    value = sys.intern(value)
+                elif key == "Faults":
+                    value = normalize_faults(value)
+                setattr(self, key, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+class Sale:
+    """A sold car: the sale figures plus a reference to its Vehicle instead of a copy of it.
+
+    Reads fall through to the vehicle, so sale["Model"] and dict(sale) still give the
+    full row that used to be stored.
+    """
+
+    __slots__ = ("vehicle",) + tuple(SALE_COLUMNS) + ("extra",)
+
+    def __init__(self, vehicle, fields=None):
+        self.vehicle = vehicle
+        self.extra = None
+        for key, value in (fields or {}).items():
+            if key in SALE_FIELDS:
+                setattr(self, key, value)
+            elif key not in CAR_FIELDS and key != SALE_VEHICLE_ROW:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[key] = value
+
+    def __getitem__(self, key):
+        if key in SALE_FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        if key == SALE_VEHICLE_ROW:
+            return self.vehicle.seq
+        return self.vehicle[key]
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = (self.vehicle.keys() + [field for field in SALE_COLUMNS if hasattr(self, field)]
+                + list(self.extra or ()))
+        if self.vehicle.seq is not None and cars_by_seq.get(self.vehicle.seq) is self.vehicle:
+            keys.append(SALE_VEHICLE_ROW)
+        return keys
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+
+def make_sale(row):
+    """Turn a stored sold-car row back into a Sale linked to its vehicle in inventory.
+
+    The car indexes must already be built. The link is the row's VehicleRow; rows stored
+    without one fall back to the first sold car with the VIN. A sale whose car is no
+    longer in inventory gets a vehicle of its own from the row.
+    """
+    key = vin_key(row.get("VIN"))
+    vehicle = cars_by_seq.get(row.get(SALE_VEHICLE_ROW))
+    if vehicle is None or vin_key(vehicle.get("VIN")) != key:
+        vehicle = next((car for car in vin_index.get(key, []) if car.get("Sold", False)), None)
+    if vehicle is None:
+        vehicle = Vehicle({key: value for key, value in row.items()
+                           if key not in SALE_FIELDS and key != SALE_VEHICLE_ROW})
+    return Sale(vehicle, row)
+
+def records_frame(records, columns):
+    """Build a DataFrame of just the given columns from dicts, Vehicles or Sales."""
+    return pd.DataFrame({column: [record.get(column) for record in records] for column in columns})
+
+@instrumented
 def load_data():
     global inventory, sold_cars, users, expenditures
-    if os.path.exists(INVENTORY_FILE):
-        inventory = pd.read_excel(INVENTORY_FILE).to_dict('records')
-    if os.path.exists(SOLD_CARS_FILE):
-        sold_cars = pd.read_excel(SOLD_CARS_FILE).to_dict('records')
-    if os.path.exists(USERS_FILE):
-        user_data = pd.read_excel(USERS_FILE).to_dict('records')
-        users = {user["Username"]: user["Password"] for user in user_data}
-    if os.path.exists(EXPENDITURES_FILE):
-        expenditures = pd.read_excel(EXPENDITURES_FILE).to_dict('records')
+    forget_archive()
+    with timed(f"load {storage.name}"), gc_paused():  # Decoding builds every row as a dict
+        inventory_rows, sold_rows, users, expenditures = storage.load()
+    with timed("build records and indexes"), gc_paused():
+        inventory = [Vehicle(row) for row in inventory_rows]
+        rebuild_car_indexes()
+        sold_cars = [make_sale(row) for row in sold_rows]
+        rebuild_expenditure_index()
+    with timed("replay journal"):
+        storage.replay()
+    with timed("sales aggregates"):
+        load_sales_aggregates()
+    bump_data_versions(*data_versions)
+    remember_file_signatures()
+
+# Startup
+@contextmanager
+def timed(name):
+    """Record how long a startup step took in startup_timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - started
+
+def preload_data():
+    """Load users now so the login prompt can be drawn, and everything else on a background thread."""
+    global users, preload_error
+    with timed("load users"):
+        users = storage.load_users()
+    preload_error = None
+    data_ready.clear()
+    threading.Thread(target=_background_load, daemon=True).start()
+
+def _background_load():
+    global preload_error
+    try:
+        load_data()
+    except Exception as e:
+        preload_error = e
+    finally:
+        startup_timings["data ready (since start)"] = time.perf_counter() - STARTED_AT
+        data_ready.set()
+
+def wait_for_data():
+    """Block until the background load has finished; a no-op when nothing is loading."""
+    if not data_ready.is_set():
+        print("Loading inventory...")
+        data_ready.wait()
+    if preload_error is not None:
+        raise preload_error
 
+def print_startup_timings():
+    print("Startup timings:")
+    for name, seconds in startup_timings.items():
+        print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+
+@instrumented
 def save_data():
-    pd.DataFrame(inventory).to_excel(INVENTORY_FILE, index=False)
-    pd.DataFrame(sold_cars).to_excel(SOLD_CARS_FILE, index=False)
-    user_data = [{"Username": username, "Password": password} for username, password in users.items()]
-    pd.DataFrame(user_data).to_excel(USERS_FILE, index=False)
-    pd.DataFrame(expenditures).to_excel(EXPENDITURES_FILE, index=False)  # Save expenditures
+    """Rewrite all stored data from memory."""
+    storage.save(inventory, sold_cars, users, expenditures)
+    remember_file_signatures()
+
+def frozen_payload(value):
+    """Copy records, dicts and lists as they are now, so later edits to a car don't leak into its journal entry."""
+    if isinstance(value, (Vehicle, Sale)):
+        value = value.to_dict()
+    if isinstance(value, dict):
+        return {key: frozen_payload(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [frozen_payload(item) for item in value]
+    return value
+
+@instrumented
+def commit_change(op, **payload):
+    """Persist a single change through the active storage engine, or hold it for the current batch."""
+    bump_data_versions(*CHANGE_DATASETS[op])  # The change is already in memory
+    payload = frozen_payload(payload)  # A batch may change the same car again before it commits
+    if pending_changes is not None:
+        pending_changes.append((op, payload))
+    else:
+        storage.commit([(op, payload)])
+
+@contextmanager
+def batch_changes():
+    """Persist every change made inside the block as one commit when it exits."""
+    global pending_changes
+    pending_changes = []
+    try:
+        yield
+    finally:
+        changes, pending_changes = pending_changes, None
+        if changes:
+            storage.commit(changes)
+            save_sales_aggregates()
+
+def compact_data(background=False):
+    """Fold pending changes into the storage engine's snapshot."""
+    storage.compact(background)
+
+def _json_default(value):
+    """Convert records and numpy/pandas scalars that json cannot serialize on its own."""
+    if isinstance(value, (Vehicle, Sale)):
+        return value.to_dict()
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+def stored_car(change, unsold_only=False):
+    """The car a change was made to: the one at its row if that car still has its VIN, else the first VIN match.
+
+    Rows are 1-based inventory positions (a car's seq). Cars are only ever appended between full
+    rewrites, so a row names the same car in every copy of the data; the VIN fallback covers
+    entries written before rows were recorded, or by a process whose data was behind.
+    """
+    key = vin_key(change["VIN"])
+    car = cars_by_seq.get(change.get("row"))
+    if car is not None and vin_key(car["VIN"]) == key and not (unsold_only and car["Sold"]):
+        return car
+    return next((c for c in vin_index.get(key, []) if not (unsold_only and c["Sold"])), None)
+
+def apply_change(entry):
+    """Apply one journal entry to the in-memory data.
+
+    The row each change landed on is written back into the entry, so a server persists and
+    relays its own rows rather than the client's.
+    """
+    op = entry["op"]
+    if op == "add_car":
+        car = Vehicle(entry["car"])
+        inventory.append(car)
+        index_car(car)
+    elif op == "import_cars":
+        cars = [Vehicle(row) for row in entry["cars"]]
+        inventory.extend(cars)
+        index_cars(cars)
+        for update in entry.get("updates", []):
+            car = stored_car(update)
+            if car:
+                change_car(car, update["fields"])
+                update["row"] = car.seq
+    elif op == "update_car":
+        car = stored_car(entry)
+        if car:
+            change_car(car, entry["fields"])
+            entry["row"] = car.seq
+    elif op == "sell_car":
+        car = stored_car(entry, unsold_only=True)
+        if car:
+            change_car(car, {"Sold": True})
+            entry["row"] = entry["sale"][SALE_VEHICLE_ROW] = car.seq
+            sold_cars.append(Sale(car, entry["sale"]))
+        else:
+            sold_cars.append(make_sale(entry["sale"]))
+    elif op == "add_user":
+        users[entry["Username"]] = entry["Password"]
+    elif op == "add_expenditure":
+        expenditures.append(entry["expenditure"])
+        index_expenditure(entry["expenditure"])
+
+# Excel storage and its change journal
+@instrumented
+def write_excel(rows, path):
+    """Write rows to a temporary workbook next to path, flushed to disk, and return its name.
+
+    Nothing replaces path here; see swap_snapshots.
+    """
+    root, ext = os.path.splitext(path)
+    tmp_path = root + ".tmp" + ext  # pandas picks the writer from the extension
+    frame = pd.DataFrame(rows)
+    if "Faults" in frame.columns:
+        frame["Faults"] = frame["Faults"].map(dump_faults)  # to_excel would write the list's repr
+    frame.to_excel(tmp_path, index=False)
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    if profiling:
+        count_bytes(path, written=file_size(tmp_path))
+    return tmp_path
+
+def write_snapshots(inventory_rows, sold_rows, user_map, expenditure_rows):
+    """Write new workbooks beside the current ones. Returns (new file, file it replaces) pairs."""
+    user_data = [{"Username": username, "Password": password} for username, password in user_map.items()]
+    return [(write_excel(rows, path), path) for rows, path in (
+        (inventory_rows, INVENTORY_FILE),
+        (sold_rows, SOLD_CARS_FILE),
+        (user_data, USERS_FILE),
+        (expenditure_rows, EXPENDITURES_FILE),
+    )]
+
+def write_text_durably(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def swap_snapshots(files, upto_seq):
+    """Put new workbooks in place of the old ones and move the checkpoint to upto_seq, crash-safely.
+
+    The pending file is written first and is the commit point: a crash before it leaves the
+    old workbooks and checkpoint in use, and a crash after it is rolled forward by
+    finish_snapshot_swap() on the next load, so the workbooks and checkpoint always agree.
+    """
+    write_text_durably(SNAPSHOT_PENDING_FILE, json.dumps({"seq": upto_seq, "files": files}))
+    finish_snapshot_swap()
+
+def finish_snapshot_swap():
+    """Complete a swap recorded in SNAPSHOT_PENDING_FILE, if there is one."""
+    if not os.path.exists(SNAPSHOT_PENDING_FILE):
+        return
+    with open(SNAPSHOT_PENDING_FILE, encoding="utf-8") as f:
+        pending = json.load(f)
+    for tmp_path, path in pending["files"]:
+        if os.path.exists(tmp_path):  # Otherwise it was swapped in before the crash
+            os.replace(tmp_path, path)
+        remember_file_signatures(path)  # Our own write, not a change for refresh_data() to reload
+    write_text_durably(JOURNAL_CHECKPOINT_FILE, str(pending["seq"]))
+    remember_file_signatures(JOURNAL_CHECKPOINT_FILE)
+    os.remove(SNAPSHOT_PENDING_FILE)
+
+@instrumented
+def append_journal(changes):
+    """Append (op, payload) changes to JOURNAL_FILE with a single fsync.
+
+    The cost depends on the number of changes, not on the size of the data.
+    """
+    global journal_seq, journal_entries
+    with journal_lock:
+        lines = []
+        for op, payload in changes:
+            journal_seq += 1
+            lines.append(json.dumps({"seq": journal_seq, "op": op, **payload}, default=_json_default) + "\n")
+        with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        journal_entries += len(lines)
+        remember_file_signatures(JOURNAL_FILE)
+        if profiling:
+            count_bytes(JOURNAL_FILE, written=sum(len(line.encode()) for line in lines))
+    if journal_entries >= JOURNAL_COMPACT_THRESHOLD:
+        compact_journal(background=True)
+
+def read_checkpoint():
+    if not os.path.exists(JOURNAL_CHECKPOINT_FILE):
+        return 0
+    with open(JOURNAL_CHECKPOINT_FILE, encoding="utf-8") as f:
+        return int(f.read().strip() or 0)
+
+@instrumented
+def replay_journal():
+    """Apply journal entries newer than the last snapshot on top of the loaded data."""
+    global journal_seq, journal_entries
+    checkpoint = read_checkpoint()
+    journal_seq = checkpoint
+    journal_entries = 0
+    if not os.path.exists(JOURNAL_FILE):
+        return
+    if profiling:
+        count_bytes(JOURNAL_FILE, read=file_size(JOURNAL_FILE))
+    with open(JOURNAL_FILE, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # Torn final write from a crash; everything before it is intact
+            if entry["seq"] <= checkpoint:
+                continue  # Already folded into the snapshots
+            apply_change(entry)
+            journal_seq = entry["seq"]
+            journal_entries += 1
+
+@instrumented
+def _compact(snapshot, upto_seq):
+    """Write the snapshots, then drop the journal entries they now contain."""
+    global journal_entries
+    files = write_snapshots(*snapshot)
+    with journal_lock:
+        swap_snapshots(files, upto_seq)
+
+        # Keep anything appended while the snapshots were being written
+        remaining = []
+        if os.path.exists(JOURNAL_FILE):
+            with open(JOURNAL_FILE, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        if json.loads(line)["seq"] > upto_seq:
+                            remaining.append(line)
+                    except ValueError:
+                        continue
+        tmp_path = JOURNAL_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(remaining)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, JOURNAL_FILE)
+        journal_entries = len(remaining)
+        if profiling:
+            count_bytes(JOURNAL_FILE, written=sum(len(line.encode()) for line in remaining))
+        remember_file_signatures(JOURNAL_FILE)
+
+def compact_journal(background=False, rows=None):
+    """Fold the journal into fresh xlsx snapshots."""
+    global compaction_thread
+    if compaction_thread is not None:
+        if background and compaction_thread.is_alive():
+            return  # One compaction at a time
+        compaction_thread.join()
+        compaction_thread = None
+
+    # Copy the rows so the snapshot stays consistent while edits continue
+    inventory_rows, sold_rows, user_map, expenditure_rows = rows or (inventory, sold_cars, users, expenditures)
+    snapshot = (
+        [dict(car) for car in inventory_rows],
+        [dict(car) for car in sold_rows],
+        dict(user_map),
+        [dict(exp) for exp in expenditure_rows],
+    )
+    upto_seq = journal_seq
+    if background:
+        compaction_thread = threading.Thread(target=_compact, args=(snapshot, upto_seq), daemon=True)
+        compaction_thread.start()
+    else:
+        _compact(snapshot, upto_seq)
+
+class ExcelStorage:
+    """The original .xlsx workbooks, with changes appended to the journal between snapshots."""
+
+    name = "excel"
+    data_files = (INVENTORY_FILE, SOLD_CARS_FILE, USERS_FILE, EXPENDITURES_FILE, JOURNAL_FILE, JOURNAL_CHECKPOINT_FILE)
+
+    @instrumented
+    def load(self):
+        finish_snapshot_swap()  # Roll forward a compaction a crash interrupted
+        inventory_rows, sold_rows, user_map, expenditure_rows = [], [], {}, []
+        if os.path.exists(INVENTORY_FILE):
+            inventory_rows = pd.read_excel(INVENTORY_FILE).to_dict('records')
+        if os.path.exists(SOLD_CARS_FILE):
+            sold_rows = pd.read_excel(SOLD_CARS_FILE).to_dict('records')
+        if os.path.exists(USERS_FILE):
+            user_data = pd.read_excel(USERS_FILE).to_dict('records')
+            user_map = {user["Username"]: user["Password"] for user in user_data}
+        if os.path.exists(EXPENDITURES_FILE):
+            expenditure_rows = pd.read_excel(EXPENDITURES_FILE).to_dict('records')
+        if profiling:
+            for path in (INVENTORY_FILE, SOLD_CARS_FILE, USERS_FILE, EXPENDITURES_FILE):
+                count_bytes(path, read=file_size(path))
+        return inventory_rows, sold_rows, user_map, expenditure_rows
+
+    @instrumented
+    def load_users(self):
+        """Read just the users, including registrations still in the journal, without pandas."""
+        finish_snapshot_swap()
+        user_map = {}
+        if os.path.exists(USERS_FILE):
+            from openpyxl import load_workbook
+            workbook = load_workbook(USERS_FILE, read_only=True)
+            rows = workbook.active.iter_rows(values_only=True)
+            header = list(next(rows, []))
+            if "Username" in header and "Password" in header:
+                name_col, password_col = header.index("Username"), header.index("Password")
+                user_map = {row[name_col]: row[password_col] for row in rows if row[name_col] is not None}
+            workbook.close()
+        if os.path.exists(JOURNAL_FILE):
+            checkpoint = read_checkpoint()
+            with open(JOURNAL_FILE, encoding="utf-8") as f:
+                for line in f:
+                    if '"add_user"' not in line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if entry["seq"] > checkpoint and entry["op"] == "add_user":
+                        user_map[entry["Username"]] = entry["Password"]
+        if profiling:
+            count_bytes(USERS_FILE, read=file_size(USERS_FILE))
+            count_bytes(JOURNAL_FILE, read=file_size(JOURNAL_FILE))
+        return user_map
+
+    def replay(self):
+        replay_journal()
+
+    @instrumented
+    def commit(self, changes):
+        if PERSISTENCE_MODE != "journal":
+            compact_journal()  # Snapshot mode: rewrite every workbook on each commit
+        else:
+            append_journal(changes)
+
+    @instrumented
+    def save(self, inventory_rows, sold_rows, user_map, expenditure_rows):
+        compact_journal(rows=(inventory_rows, sold_rows, user_map, expenditure_rows))
+
+    def compact(self, background=False):
+        compact_journal(background)
+
+# SQLite storage
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory (id INTEGER PRIMARY KEY, vin TEXT, data TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS inventory_vin ON inventory (vin);
+CREATE TABLE IF NOT EXISTS sold_cars (id INTEGER PRIMARY KEY, vin TEXT, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS expenditures (id INTEGER PRIMARY KEY, vin TEXT, data TEXT NOT NULL);
+"""
+
+class SQLiteStorage:
+    """A single SQLite database; each change is a per-row insert or update in its own transaction."""
+
+    name = "sqlite"
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self.data_files = (path,)
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.executescript(SQLITE_SCHEMA)
+        return self.conn
+
+    @instrumented
+    def load(self):
+        with self.lock:
+            conn = self.connect()
+            inventory_rows = self._load_rows(conn, "inventory")
+            sold_rows = self._load_rows(conn, "sold_cars")
+            user_map = dict(conn.execute("SELECT username, password FROM users"))
+            expenditure_rows = self._load_rows(conn, "expenditures")
+        return inventory_rows, sold_rows, user_map, expenditure_rows
+
+    def load_users(self):
+        with self.lock:
+            return dict(self.connect().execute("SELECT username, password FROM users"))
+
+    def _load_rows(self, conn, table):
+        # Let SQLite join the rows into one JSON array so they decode in a single json.loads call
+        query = f"SELECT '[' || ifnull(group_concat(data, ','), '') || ']' FROM (SELECT data FROM {table} ORDER BY id)"
+        text = conn.execute(query).fetchone()[0]
+        if profiling:
+            count_bytes(self.path, read=len(text))
+        return json.loads(text)
+
+    def _dumps(self, row):
+        text = json.dumps(row, default=_json_default)
+        if profiling:
+            count_bytes(self.path, written=len(text))
+        return text
+
+    def replay(self):
+        pass  # Every change is already in the database
+
+    @instrumented
+    def commit(self, changes):
+        with self.lock:
+            conn = self.connect()
+            with conn:  # One transaction per commit
+                for op, payload in changes:
+                    self._apply(conn, op, payload)
+        remember_file_signatures(self.path)
+
+    def _apply(self, conn, op, payload):
+        if op == "add_car":
+            car = payload["car"]
+            conn.execute("INSERT INTO inventory (vin, data) VALUES (?, ?)", (vin_key(car.get("VIN")), self._dumps(car)))
+        elif op == "import_cars":
+            conn.executemany("INSERT INTO inventory (vin, data) VALUES (?, ?)",
+                             [(vin_key(car.get("VIN")), self._dumps(car)) for car in payload["cars"]])
+            for update in payload.get("updates", []):
+                self._apply(conn, "update_car", update)
+        elif op == "update_car":
+            row = self._stored_car(conn, payload)
+            if row:
+                row_id, car = row
+                car.update(payload["fields"])
+                conn.execute("UPDATE inventory SET data = ? WHERE id = ?", (self._dumps(car), row_id))
+        elif op == "sell_car":
+            row = self._stored_car(conn, payload, unsold_only=True)
+            if row:
+                row_id, car = row
+                car["Sold"] = True
+                conn.execute("UPDATE inventory SET data = ? WHERE id = ?", (self._dumps(car), row_id))
+            conn.execute("INSERT INTO sold_cars (vin, data) VALUES (?, ?)", (vin_key(payload["VIN"]), self._dumps(payload["sale"])))
+        elif op == "add_user":
+            conn.execute("INSERT OR REPLACE INTO users (username, password) VALUES (?, ?)",
+                         (payload["Username"], payload["Password"]))
+        elif op == "add_expenditure":
+            expenditure = payload["expenditure"]
+            conn.execute("INSERT INTO expenditures (vin, data) VALUES (?, ?)",
+                         (vin_key(expenditure.get("VIN")), self._dumps(expenditure)))
+
+    def _stored_car(self, conn, change, unsold_only=False):
+        """(id, car) for the row a change names, as stored_car() does in memory; ids are inventory positions."""
+        key = vin_key(change["VIN"])
+        for query, params in (("SELECT id, data FROM inventory WHERE id = ? AND vin = ?", (change.get("row"), key)),
+                              ("SELECT id, data FROM inventory WHERE vin = ? ORDER BY id", (key,))):
+            for row_id, data in conn.execute(query, params).fetchall():
+                car = json.loads(data)
+                if not (unsold_only and car.get("Sold", False)):
+                    return row_id, car
+        return None
+
+    @instrumented
+    def save(self, inventory_rows, sold_rows, user_map, expenditure_rows):
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                for table in ("inventory", "sold_cars", "users", "expenditures"):
+                    conn.execute(f"DELETE FROM {table}")
+                conn.executemany("INSERT INTO inventory (id, vin, data) VALUES (?, ?, ?)",
+                                 [(row_id, vin_key(car.get("VIN")), self._dumps(car))
+                                  for row_id, car in enumerate(inventory_rows, 1)])
+                conn.executemany("INSERT INTO sold_cars (vin, data) VALUES (?, ?)",
+                                 [(vin_key(car.get("VIN")), self._dumps(car)) for car in sold_rows])
+                conn.executemany("INSERT INTO users (username, password) VALUES (?, ?)", list(user_map.items()))
+                conn.executemany("INSERT INTO expenditures (vin, data) VALUES (?, ?)",
+                                 [(vin_key(exp.get("VIN")), self._dumps(exp)) for exp in expenditure_rows])
+
+    def compact(self, background=False):
+        pass  # Nothing is pending; every commit already hit the database
+
+# Server client storage
+class ServerError(ValueError):
+    """A request the inventory server refused."""
+
+def parse_address(address):
+    host, _, port = str(address).rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+class RemoteStorage:
+    """The store owned by an inventory server (see run_server), with a mirror of it in this process.
+
+    Reads are served from the mirror, which catches up on other clients' changes whenever
+    refresh_data() runs. Changes are made to the mirror first, as with any engine, then sent
+    to the server; if it refuses them the mirror is reloaded from the server.
+    """
+
+    name = "remote"
+    data_files = ()
+
+    def __init__(self, address=SERVER_ADDRESS):
+        self.address = parse_address(address)
+        self.stream = None
+        self.seq = 0  # Last server change the mirror holds
+        self.own_seqs = set()  # Server numbers of our own changes, which the mirror already holds
+        self.sales_aggregates = None
+        self.lock = threading.Lock()
+
+    def request(self, op, **fields):
+        line = json.dumps({"op": op, **fields}, default=_json_default).encode("utf-8") + b"\n"
+        with self.lock:
+            if self.stream is None:
+                import socket
+                self.stream = socket.create_connection(self.address).makefile("rwb")
+            self.stream.write(line)
+            self.stream.flush()
+            reply = self.stream.readline()
+        if not reply:
+            raise ConnectionError(f"the inventory server at {self.address[0]}:{self.address[1]} closed the connection")
+        response = json.loads(reply)
+        if not response["ok"]:
+            raise ServerError(response["error"])
+        return response
+
+    @instrumented
+    def load(self):
+        snapshot = self.request("snapshot")
+        self.seq = snapshot["seq"]
+        self.own_seqs.clear()
+        self.sales_aggregates = snapshot["sales_aggregates"]
+        return snapshot["inventory"], snapshot["sold_cars"], snapshot["users"], snapshot["expenditures"]
+
+    def load_users(self):
+        return self.request("users")["users"]
+
+    def replay(self):
+        pass  # The snapshot is already current
+
+    @instrumented
+    def sync(self):
+        """Apply the changes other clients have made since the mirror was last brought up to date."""
+        response = self.request("changes", since=self.seq)
+        if response.get("reload"):
+            load_data()  # Too far behind for the change log, or the server reorganized its data
+            return
+        for entry in response["changes"]:
+            if entry["seq"] in self.own_seqs:
+                self.own_seqs.discard(entry["seq"])
+            else:
+                apply_change(entry)
+                if entry["op"] == "sell_car":
+                    record_sale_aggregates(sold_cars[-1])
+                bump_data_versions(*CHANGE_DATASETS[entry["op"]])
+            self.seq = entry["seq"]
+
+    @instrumented
+    def commit(self, changes):
+        try:
+            response = self.request("commit", changes=[{"op": op, **payload} for op, payload in changes])
+        except ServerError:
+            load_data()  # Drop the refused changes from the mirror
+            raise
+        self.own_seqs.update(response["seqs"])
+
+    def save(self, inventory_rows, sold_rows, user_map, expenditure_rows):
+        raise ServerError("the server owns the stored data; stop it to rewrite or migrate the files")
+
+    def compact(self, background=False):
+        pass  # The server persists every change as it commits it
+
+STORAGE_ENGINES = {"excel": ExcelStorage, "sqlite": SQLiteStorage}
+storage = STORAGE_ENGINES[STORAGE_ENGINE]()  # Active storage engine
+
+def migrate_storage(source_name, target_name):
+    """One-shot conversion of all stored data from one engine to another."""
+    global storage
+    if source_name == target_name:
+        print("Source and target storage engines are the same.")
+        return
+    storage = STORAGE_ENGINES[source_name]()
+    load_data()
+    if target_name == "excel":
+        # The workbooks are being replaced wholesale, so any old journal no longer applies
+        for path in (JOURNAL_FILE, JOURNAL_CHECKPOINT_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        replay_journal()  # Reset the journal counters
+    storage = STORAGE_ENGINES[target_name]()
+    save_data()
+    print(f"Migrated {len(inventory)} vehicles, {len(sold_cars)} sold cars, {len(users)} users and "
+          f"{len(expenditures)} expenditures from {source_name} to {target_name}.")
+
+# Read cache
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def remember_file_signatures(*paths):
+    """Record the current state of data files we have just loaded or written ourselves."""
+    for path in paths or storage.data_files:
+        file_signatures[path] = file_signature(path)
+
+@instrumented
+def refresh_data():
+    """Reload only if another process has changed a data file since we last loaded or wrote it."""
+    if storage.name == "remote":
+        storage.sync()
+        return
+    # A background compaction swaps files and records their signatures under the journal lock,
+    # so holding it here means our own writes are never mistaken for another process's
+    with journal_lock:
+        changed = any(file_signature(path) != file_signatures.get(path) for path in storage.data_files)
+    if changed:
+        load_data()
+
+def current_inventory(show_all=True):
+    """Cars to show on the browsing screens, served from memory.
+
+    Unsold cars are filtered lazily so a screen only walks as far as it displays.
+    """
+    refresh_data()
+    if show_all:
+        return inventory
+    return (car for car in inventory if not car.get("Sold", False))
+
+def current_sold_cars():
+    refresh_data()
+    return all_sales()
+
+# Archive
+def forget_archive():
+    global archive_index, archive_vins
+    archive_index = archive_vins = None
+    archive_months.clear()
+
+def read_json_file(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def load_archive_index():
+    global archive_index
+    if archive_index is None:
+        archive_index = read_json_file(ARCHIVE_INDEX_FILE, {"months": {}})
+    return archive_index
+
+def load_archive_vins():
+    global archive_vins
+    if archive_vins is None:
+        archive_vins = read_json_file(ARCHIVE_VINS_FILE, {})
+    return archive_vins
+
+def archive_path(month):
+    return os.path.join(ARCHIVE_DIR, f"{month}.json.gz")
+
+def archived_count(dataset):
+    return sum(counts.get(dataset, 0) for counts in load_archive_index()["months"].values())
+
+@instrumented
+def read_archive_month(month):
+    """The {"sold_cars": [...], "expenditures": [...]} archived for a month, read once per load."""
+    records = archive_months.get(month)
+    if records is None:
+        path = archive_path(month)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            records = json.load(f)
+        if profiling:
+            count_bytes(path, read=file_size(path))
+        archive_months[month] = records
+    return records
+
+def all_sales():
+    """Every sale on record, archived months first; the archives are only read if this is iterated."""
+    if not archived_count("sold_cars"):
+        return sold_cars
+    return chain(archived_records("sold_cars"), sold_cars)
+
+def archived_records(dataset):
+    for month in sorted(load_archive_index()["months"]):
+        yield from read_archive_month(month)[dataset]
+
+def find_archived_cars(vin_input):
+    """Archived sales matching a full VIN or its last 6 characters, as read-only rows."""
+    key = vin_key(vin_input)
+    vins = load_archive_vins() if key else {}
+    months = vins.get(key)
+    if months:
+        keys = {key}
+    elif len(key) <= 6:
+        keys = {vin for vin in vins if vin.endswith(key)}
+        months = {month for vin in keys for month in vins[vin]}
+    else:
+        return []
+    return [row for month in sorted(months) for row in read_archive_month(month)["sold_cars"]
+            if vin_key(row.get("VIN")) in keys]
+
+def record_day(value):
+    """The YYYY-MM-DD a SaleDate or expenditure Date falls on, or None if it has none."""
+    day = str(value or "")[:10]
+    return day if re.fullmatch(r"\d{4}-\d{2}-\d{2}", day) else None
+
+@instrumented
+def archive_data(days=ARCHIVE_AFTER_DAYS):
+    """Move sales older than days, with their cars and settled expenditures, into the monthly archives.
+
+    A car expenditure is settled once its car has left the working set, and is filed under
+    its own Date or, for older records without one, the car's sale date. Miscellaneous spend
+    is filed under its Date. Returns the number of sales and expenditures archived.
+    """
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    months = {}  # Month -> {"sold_cars": rows, "expenditures": rows} to add to its archive
+    archived_vehicles = set()
+    sale_days = {}  # Normalized VIN -> day its archived sale happened
+    kept_sales = []
+    for sale in sold_cars:
+        day = record_day(sale.get("SaleDate"))
+        if day is None or day >= cutoff:
+            kept_sales.append(sale)
+            continue
+        row = sale.to_dict()
+        row.pop(SALE_VEHICLE_ROW, None)  # Rows are renumbered once the car leaves inventory
+        months.setdefault(day[:7], {"sold_cars": [], "expenditures": []})["sold_cars"].append(row)
+        archived_vehicles.add(id(sale.vehicle))
+        key = vin_key(sale.get("VIN"))
+        sale_days[key] = max(day, sale_days.get(key, day))
+    kept_cars = [car for car in inventory if id(car) not in archived_vehicles]
+    live_vins = {vin_key(car.get("VIN")) for car in kept_cars}
+
+    kept_expenditures = []
+    for expenditure in expenditures:
+        key = vin_key(expenditure.get("VIN"))
+        day = record_day(expenditure.get("Date")) or sale_days.get(key)
+        if day is None or day >= cutoff or key in live_vins:
+            kept_expenditures.append(expenditure)
+            continue
+        months.setdefault(day[:7], {"sold_cars": [], "expenditures": []})["expenditures"].append(dict(expenditure))
+    if not months:
+        return 0, 0
+
+    # Write the archives before dropping anything from the working set, so a crash
+    # in between leaves records in both places; the merge below ignores the repeats
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    index = load_archive_index()
+    vins = load_archive_vins()
+    for month, records in months.items():
+        merged = read_archive_month(month) if os.path.exists(archive_path(month)) else {"sold_cars": [], "expenditures": []}
+        for dataset, rows in records.items():
+            seen = {json.dumps(row, sort_keys=True, default=_json_default) for row in merged[dataset]}
+            for row in rows:
+                text = json.dumps(row, sort_keys=True, default=_json_default)
+                if text not in seen:
+                    seen.add(text)
+                    merged[dataset].append(row)
+        data = gzip.compress(json.dumps(merged, separators=(",", ":"), default=_json_default).encode("utf-8"))
+        write_file_atomic(archive_path(month), data)
+        archive_months.pop(month, None)  # Read back from disk if needed, as a reload would
+        index["months"][month] = {dataset: len(rows) for dataset, rows in merged.items()}
+        for row in merged["sold_cars"]:
+            key = vin_key(row.get("VIN"))
+            if key and month not in vins.setdefault(key, []):
+                vins[key].append(month)
+    write_file_atomic(ARCHIVE_VINS_FILE, json.dumps(vins, separators=(",", ":")).encode("utf-8"))
+    write_file_atomic(ARCHIVE_INDEX_FILE, json.dumps(index, indent=2, sort_keys=True).encode("utf-8"))
+
+    inventory[:] = kept_cars
+    sold_cars[:] = kept_sales
+    expenditures[:] = kept_expenditures
+    with gc_paused():
+        rebuild_car_indexes()
+        rebuild_expenditure_index()
+    save_data()
+    bump_data_versions(*data_versions)
+    return (sum(len(records["sold_cars"]) for records in months.values()),
+            sum(len(records["expenditures"]) for records in months.values()))
+
+# Report cache
+def bump_data_versions(*datasets):
+    """Give the datasets a new version so reports rendered from their old contents are no longer served."""
+    global data_version
+    data_version += 1
+    for name in datasets:
+        data_versions[name] = data_version
+
+def report_key(name, params, *datasets):
+    """Cache key for a report: its name, whatever parameters change its output, and the data versions it reads."""
+    return (name, params) + tuple(data_versions[dataset] for dataset in datasets)
+
+class ReportCache:
+    """Least-recently-used cache of rendered reports, bounded by entry count and total size."""
+
+    def __init__(self, max_entries=REPORT_CACHE_ENTRIES, max_bytes=REPORT_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # Key -> (value, size)
+        self.size = 0
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def size_of(value):
+        if isinstance(value, (bytes, str)):
+            return len(value)
+        if isinstance(value, list):
+            return sum(len(item) if isinstance(item, str) else 64 for item in value)
+        if hasattr(value, "memory_usage"):
+            return int(value.memory_usage(index=True, deep=False).sum())  # A DataFrame
+        return 64
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            return  # Larger than the whole cache; not worth evicting everything else for
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (value, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+report_cache = ReportCache()
+
+def cached_report(key, build):
+    """Return the report cached under key, building and caching it on a miss."""
+    value = report_cache.get(key)
+    if value is None:
+        value = build()
+        report_cache.put(key, value)
+    return value
+
+def vin_report_key(vin_input, car):
+    # Archived rows have no sequence number, but stay the same objects until the next load
+    return report_key("vin", (vin_input, car.seq if isinstance(car, Vehicle) else id(car)), "inventory")
+
+def vin_report_lines(car):
+    return [
+        f"Name: {car.get('Name', 'N/A')}\n",
+        f"Model: {car.get('Model', 'N/A')}\n",
+        f"Type: {car.get('Type', 'N/A')}\n",
+        f"Year: {car.get('Year', 'N/A')}\n",
+        f"VIN: {car.get('VIN', 'N/A')}\n",
+        f"Mileage: {car.get('Mileage', 'N/A')}\n",
+        f"Faults: {', '.join(car.get('Faults', []))}\n",
+        f"Price: ${car.get('Price', 0.0):.2f}\n",
+        f"Sold: {car.get('Sold', False)}"
+    ]
+
+# Paged browsing
+def format_car(idx, car, indent=""):
+    return (
+        f"{idx}.\n"
+        f"{indent}Name: {car.get('Name', 'N/A')}\n"
+        f"{indent}Model: {car.get('Model', 'N/A')}\n"
+        f"{indent}Type: {car.get('Type', 'N/A')}\n"
+        f"{indent}Year: {car.get('Year', 'N/A')}\n"
+        f"{indent}VIN: {car.get('VIN', 'N/A')}\n"
+        f"{indent}Mileage: {car.get('Mileage', 'N/A')}\n"
+        f"{indent}Faults: {', '.join(car.get('Faults', []))}\n"
+        f"{indent}Price: ${car.get('Price', 0.0):.2f}\n"
+        f"{indent}Sold: {car.get('Sold', False)}\n"
+    )
+
+def sort_value(value):
+    """Sort numbers numerically and everything else as text; Year and Mileage are often stored as strings."""
+    try:
+        return (0, float(value), "")
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
+
+@instrumented
+def get_page(cars, page, page_size):
+    """Return the cars on one page and whether another page follows it."""
+    start = page * page_size
+    if isinstance(cars, list):
+        visible = cars[start:start + page_size + 1]
+    else:
+        visible = list(islice(cars, start, start + page_size + 1))
+    return visible[:page_size], len(visible) > page_size
+
+def browse_cars(title, get_cars, indent="", page_size=None):
+    """Page through cars with next/prev/jump, formatting only the visible page.
+
+    get_cars is called for each screen so the pager always shows current data.
+    """
+    page_size = page_size or PAGE_SIZE
+    page = 0
+    sort_key = None
+    sorted_cars = None
+    while True:
+        clear_console()
+        print(title)
+        cars = sorted_cars if sort_key else get_cars()
+        visible, has_next = get_page(cars, page, page_size)
+
+        if not visible and page == 0:
+            print("No vehicles to display.")
+            input("\nPress Enter to go back.")
+            return
+        if not visible:
+            page = 0  # Jumped past the end
+            continue
+
+        start = page * page_size
+        for idx, car in enumerate(visible, start=start + 1):
+            print(format_car(idx, car, indent))
+        sort_note = f", sorted by {sort_key}" if sort_key else ""
+        print(f"Page {page + 1}{'' if has_next else ' (last page)'}{sort_note}")
+
+        command = input("[n]ext, [p]revious, [j]ump to page, [s]ort, page si[z]e, [b]ack: ").strip().lower()
+        if command in ("n", "") and has_next:
+            page += 1
+        elif command == "p" and page > 0:
+            page -= 1
+        elif command == "j":
+            target = input("Go to page: ").strip()
+            if target.isdigit() and int(target) > 0:
+                page = int(target) - 1
+        elif command == "s":
+            for idx, key in enumerate(SORT_KEYS, start=1):
+                print(f"{idx}. {key}")
+            print(f"{len(SORT_KEYS) + 1}. No sorting")
+            choice = input("Sort by: ").strip()
+            if choice.isdigit() and 1 <= int(choice) <= len(SORT_KEYS):
+                sort_key = SORT_KEYS[int(choice) - 1]
+                descending = input("Descending? (y/n): ").lower() == "y"
+                sorted_cars = sorted(get_cars(), key=lambda c: sort_value(c.get(sort_key)), reverse=descending)
+            else:
+                sort_key, sorted_cars = None, None
+            page = 0
+        elif command == "z":
+            size = input("Vehicles per page: ").strip()
+            if size.isdigit() and int(size) > 0:
+                page = (page * page_size) // int(size)  # Stay near the same vehicles
+                page_size = int(size)
+        elif command == "b":
+            return
+
+# VIN lookups
+def vin_key(value):
+    """Normalize a VIN for indexing; workbooks may hand numeric VINs back as numbers."""
+    if type(value) is str:
+        return value.strip().upper()
+    if value is None or value != value:  # Missing or NaN
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().upper()
+
+def index_car(car):
+    """Add a car to the VIN and search indexes. Must be called for every car added to inventory."""
+    global car_seq
+    if car.seq is None:
+        car_seq += 1
+        car.seq = car_seq
+    cars_by_seq[car.seq] = car
+    for field in INDEXED_FIELDS:
+        index_field(car, field)
+
+def index_cars(cars):
+    """Index many cars at once, one field at a time, sorting each range index once at the end."""
+    if len(cars) <= BULK_INDEX_MIN:
+        for car in cars:
+            index_car(car)
+        return
+    with gc_paused():
+        _index_cars(cars)
+
+def _index_cars(cars):
+    global car_seq
+    for car in cars:
+        key = vin_key(car.get("VIN"))
+        if key:
+            vin_index.setdefault(key, []).append(car)
+            vin_suffix_index.setdefault(key[-6:], []).append(car)
+        if car.seq is None:
+            car_seq += 1
+            car.seq = car_seq
+        cars_by_seq[car.seq] = car
+    for field in HASH_INDEX_FIELDS:
+        index = hash_indexes[field]
+        keys = {}  # Raw value -> search_value(); the same few makes and types repeat across the lot
+        for car in cars:
+            value = getattr(car, field, None)
+            try:
+                key = keys[value]
+            except KeyError:
+                key = keys[value] = search_value({field: value}, field)
+            index.setdefault(key, set()).add(car.seq)
+    for field in NUMERIC_FIELDS:
+        values, seqs = (list(column) for column in range_indexes[field])
+        for car in cars:
+            value = getattr(car, field, None)
+            number = value if type(value) is int else parse_number(value)
+            if number is not None:
+                values.append(number)
+                seqs.append(car.seq)
+        # A stable sort keeps equal values in sequence order, since new cars have the highest numbers
+        order = sorted(range(len(values)), key=values.__getitem__)
+        range_indexes[field] = (array("d", [values[i] for i in order]), array("q", [seqs[i] for i in order]))
+    words = {}  # Fault -> its words; the same faults repeat across the lot
+    for car in cars:
+        for fault in car.get("Faults", []):
+            fault_index.setdefault(fault, set()).add(car.seq)
+            if fault not in words:
+                words[fault] = fault_words(fault)
+            for word in words[fault]:
+                fault_word_index.setdefault(word, set()).add(car.seq)
+
+def rebuild_car_indexes():
+    global car_seq
+    vin_index.clear()
+    vin_suffix_index.clear()
+    cars_by_seq.clear()
+    for field in HASH_INDEX_FIELDS:
+        hash_indexes[field].clear()
+    for field in NUMERIC_FIELDS:
+        range_indexes[field] = (array("d"), array("q"))
+    fault_index.clear()
+    fault_word_index.clear()
+    car_seq = 0
+    for car in inventory:
+        car.seq = None
+    index_cars(inventory)
+
+@instrumented
+def find_cars(vin_input, unsold_only=False):
+    """Return the cars matching a full VIN or, failing that, its last 6 characters."""
+    key = vin_key(vin_input)
+    if not key:
+        return []
+    matches = vin_index.get(key)
+    if not matches and len(key) <= 6:
+        matches = vin_suffix_index.get(key)
+    matches = matches or []
+    if unsold_only:
+        matches = [c for c in matches if not c.get("Sold", False)]
+    return matches
+
+def resolve_vin(vin_input, unsold_only=False, archived=False):
+    """Find a single car by VIN, asking the user to pick when the last 6 digits are ambiguous.
+
+    With archived, a VIN not in the working set is looked up in the archives.
+    """
+    matches = find_cars(vin_input, unsold_only)
+    if not matches and archived:
+        matches = find_archived_cars(vin_input)
+    if len(matches) <= 1:
+        return matches[0] if matches else None
+
+    print("More than one vehicle matches that VIN:")
+    for idx, car in enumerate(matches, start=1):
+        print(f"{idx}. {car.get('Year', 'N/A')} {car.get('Name', 'N/A')} {car.get('Model', 'N/A')} - VIN: {car.get('VIN', 'N/A')}")
+    choice = input("Select a vehicle (or press Enter to cancel): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(matches):
+        return matches[int(choice) - 1]
+    return None
+
+# Vehicle search
+def parse_number(value):
+    """Read a Year, Mileage or Price typed as 2018, "80,000" or "$19,500"; None if it is not a number."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value if value == value else None  # NaN from an empty spreadsheet cell
+    try:
+        number = float(str(value).strip().replace(",", "").lstrip("$"))
+    except ValueError:
+        return None
+    return int(number) if number.is_integer() else number
+
+def typed_fields(fields):
+    """Store numeric columns as numbers and faults normalized; text that is not a number is kept as typed."""
+    typed = dict(fields)
+    if "Faults" in typed:
+        typed["Faults"] = normalize_faults(typed["Faults"])
+    for field in NUMERIC_FIELDS:
+        if field in typed:
+            number = parse_number(typed[field])
+            if number is not None:
+                typed[field] = number
+    return typed
+
+def search_value(car, field):
+    """The hash-index key for a field: case-folded text, or True/False for Sold."""
+    value = car.get(field)
+    if field == "Sold":
+        return bool(value) and value == value
+    if value is None or value != value:
+        return ""
+    return str(value).strip().casefold()
+
+def index_field(car, field):
+    """Add a car under its current value of one indexed field."""
+    if field == "VIN":
+        key = vin_key(car.get("VIN"))
+        if key:
+            vin_index.setdefault(key, []).append(car)
+            vin_suffix_index.setdefault(key[-6:], []).append(car)
+    elif field in HASH_INDEX_FIELDS:
+        hash_indexes[field].setdefault(search_value(car, field), set()).add(car.seq)
+    elif field == "Faults":
+        for fault in car.get("Faults", []):
+            fault_index.setdefault(fault, set()).add(car.seq)
+            for word in fault_words(fault):
+                fault_word_index.setdefault(word, set()).add(car.seq)
+    else:
+        number = parse_number(car.get(field))
+        if number is None:
+            return
+        values, seqs = range_indexes[field]
+        lo, hi = bisect_left(values, number), bisect_right(values, number)
+        position = bisect_left(seqs, car.seq, lo, hi)  # Equal values stay in inventory order
+        values.insert(position, number)
+        seqs.insert(position, car.seq)
+
+def unindex_field(car, field):
+    """Remove a car from one indexed field, using its current value."""
+    if field == "VIN":
+        key = vin_key(car.get("VIN"))
+        for index, index_key in ((vin_index, key), (vin_suffix_index, key[-6:])):
+            remaining = [c for c in index.get(index_key, ()) if c is not car]
+            if remaining:
+                index[index_key] = remaining
+            else:
+                index.pop(index_key, None)
+    elif field in HASH_INDEX_FIELDS:
+        key = search_value(car, field)
+        bucket = hash_indexes[field].get(key)
+        if bucket is not None:
+            bucket.discard(car.seq)
+            if not bucket:
+                del hash_indexes[field][key]
+    elif field == "Faults":
+        faults = car.get("Faults", [])
+        words = set().union(*map(fault_words, faults))
+        for index, keys in ((fault_index, faults), (fault_word_index, words)):
+            for key in keys:
+                bucket = index.get(key)
+                if bucket is not None:
+                    bucket.discard(car.seq)
+                    if not bucket:
+                        del index[key]
+    else:
+        number = parse_number(car.get(field))
+        if number is None:
+            return
+        values, seqs = range_indexes[field]
+        lo, hi = bisect_left(values, number), bisect_right(values, number)
+        position = bisect_left(seqs, car.seq, lo, hi)
+        if position < hi and seqs[position] == car.seq:
+            del values[position]
+            del seqs[position]
+
+def unindex_car(car):
+    """Remove a car from the VIN and search indexes."""
+    for field in INDEXED_FIELDS:
+        unindex_field(car, field)
+    cars_by_seq.pop(car.seq, None)
+
+def change_car(car, fields):
+    """Apply field changes to a car in inventory, re-indexing only the indexed fields whose value changes."""
+    if "Faults" in fields:
+        fields = {**fields, "Faults": normalize_faults(fields["Faults"])}
+    changed = [field for field in INDEXED_FIELDS if field in fields and car.get(field) != fields[field]]
+    for field in changed:
+        unindex_field(car, field)
+    car.update(fields)
+    for field in changed:
+        index_field(car, field)
+
+class CarQuery:
+    """A composable inventory search. Each method narrows the query and returns it, e.g.
+
+        CarQuery().where("Type", "SUV").between("Year", 2018, 2021).between("Mileage", high=80000)
+                  .between("Price", high=20000).with_fault("transmission").unsold().order_by("Price").cars()
+
+    Conditions are answered from the indexes, most selective first; once the candidates are
+    few, a wide range condition is checked car by car instead of read from its index.
+    """
+
+    def __init__(self):
+        self.conditions = []  # ("hash", field, keys), ("range", field, low, high) or ("fault", "Faults", terms)
+        self.sort_field = None
+        self.descending = False
+
+    def where(self, field, *values):
+        """Match any of the given values of Type, Model, Name or Sold (text ignores case)."""
+        if field not in HASH_INDEX_FIELDS:
+            raise ValueError(f"cannot search by {field}; use one of {', '.join(HASH_INDEX_FIELDS)}")
+        keys = {search_value({field: value}, field) for value in values}
+        self.conditions.append(("hash", field, keys))
+        return self
+
+    def between(self, field, low=None, high=None):
+        """Match Year, Mileage or Price from low to high inclusive; either end may be left open."""
+        if field not in NUMERIC_FIELDS:
+            raise ValueError(f"cannot search a range of {field}; use one of {', '.join(NUMERIC_FIELDS)}")
+        self.conditions.append(("range", field, low, high))
+        return self
+
+    def with_fault(self, *terms):
+        """Match cars with any of the given faults, as a whole fault ("check engine light") or a word of one ("transmission")."""
+        self.conditions.append(("fault", "Faults", normalize_faults(list(terms))))
+        return self
+
+    def sold(self, is_sold=True):
+        return self.where("Sold", is_sold)
+
+    def unsold(self):
+        return self.where("Sold", False)
+
+    def order_by(self, field, descending=False):
+        self.sort_field = field
+        self.descending = descending
+        return self
+
+    def _bounds(self, field, low, high):
+        values = range_indexes[field][0]
+        lo = 0 if low is None else bisect_left(values, low)
+        hi = len(values) if high is None else bisect_right(values, high)
+        return lo, max(lo, hi)
+
+    def _estimate(self, condition):
+        if condition[0] == "hash":
+            return sum(len(hash_indexes[condition[1]].get(key, ())) for key in condition[2])
+        if condition[0] == "fault":
+            return sum(len(fault_index.get(term, ())) + len(fault_word_index.get(term, ())) for term in condition[2])
+        lo, hi = self._bounds(*condition[1:])
+        return hi - lo
+
+    def _materialize(self, condition):
+        """The condition's matches; a single hash bucket is returned as is, so callers must not modify it."""
+        if condition[0] == "hash":
+            buckets = [hash_indexes[condition[1]].get(key, set()) for key in condition[2]]
+            return buckets[0] if len(buckets) == 1 else set().union(*buckets)
+        if condition[0] == "fault":
+            return set().union(*(fault_cars(term) for term in condition[2]))
+        lo, hi = self._bounds(*condition[1:])
+        return set(range_indexes[condition[1]][1][lo:hi])
+
+    def _test(self, car, condition):
+        if condition[0] == "hash":
+            return search_value(car, condition[1]) in condition[2]
+        if condition[0] == "fault":
+            return any(fault_matches(fault, term) for fault in car.get("Faults", []) for term in condition[2])
+        _, field, low, high = condition
+        value = getattr(car, field, None)
+        number = value if type(value) in (int, float) else parse_number(value)
+        return number is not None and (low is None or number >= low) and (high is None or number <= high)
+
+    def seqs(self):
+        """Sequence numbers of the matching cars, in no particular order."""
+        if not self.conditions:
+            return set(cars_by_seq)
+        planned = sorted(self.conditions, key=self._estimate)
+        matched = set(self._materialize(planned[0]))
+        for condition in planned[1:]:
+            if not matched:
+                break
+            # Hash buckets intersect for free; a wide range is cheaper to check car by car
+            if condition[0] != "range" or self._estimate(condition) <= 5 * len(matched):
+                matched &= self._materialize(condition)
+            else:
+                matched = {seq for seq in matched if self._test(cars_by_seq[seq], condition)}
+        return matched
+
+    def cars(self):
+        """The matching cars, in the requested order or else in inventory order."""
+        matched = [cars_by_seq[seq] for seq in sorted(self.seqs())]
+        if self.sort_field:
+            matched.sort(key=lambda car: sort_value(car.get(self.sort_field)), reverse=self.descending)
+        return matched
+
+    def count(self):
+        return len(self.seqs())
+
+def fault_matches(fault, term):
+    return fault == term or fault_words(term) <= fault_words(fault)
+
+def fault_cars(term):
+    """Sequence numbers of cars with a fault that is, or contains every word of, the term."""
+    words = fault_words(term)
+    if not words:
+        return set()
+    matched = set(fault_index.get(term, ()))
+    candidates = set.intersection(*(fault_word_index.get(word, set()) for word in words))
+    if len(words) == 1:
+        return matched | candidates
+    # The words could come from different faults of the same car, so check the candidates
+    return matched | {seq for seq in candidates
+                      if any(fault_matches(fault, term) for fault in cars_by_seq[seq].get("Faults", []))}
+
+def fault_counts(unsold_only=False):
+    """(fault, number of cars with it) pairs, most common first, read straight from the fault index."""
+    unsold = hash_indexes["Sold"].get(False, set())
+    counts = [(fault, len(seqs & unsold) if unsold_only else len(seqs)) for fault, seqs in fault_index.items()]
+    return sorted((pair for pair in counts if pair[1]), key=lambda pair: (-pair[1], pair[0]))
+
+def fault_report_lines(unsold_only=True):
+    counts = fault_counts(unsold_only)
+    lines = [f"Faults across {'unsold' if unsold_only else 'all'} vehicles:\n"]
+    lines += [f"  {fault}: {count}\n" for fault, count in counts] or ["  No faults recorded.\n"]
+    return lines
+
+def parse_range(text):
+    """Read "2018-2021", "-80000", "5000-" or "2019" as (low, high) for CarQuery.between."""
+    text = text.strip()
+    if not text:
+        return None
+    if text.startswith("-"):
+        low_text, high_text = "", text[1:]
+    elif "-" in text:
+        low_text, _, high_text = text.partition("-")
+    else:
+        low_text = high_text = text
+    low, high = parse_number(low_text), parse_number(high_text)
+    if (low_text.strip() and low is None) or (high_text.strip() and high is None):
+        raise ValueError(f"'{text}' is not a number or range such as 2018-2021")
+    return low, high
+
+def build_query(types=(), models=(), names=(), year=None, mileage=None, price=None, sold=None, faults=()):
+    """Build a CarQuery from the search screen or command-line filters; empty filters are skipped."""
+    query = CarQuery()
+    for field, values in (("Type", types), ("Model", models), ("Name", names)):
+        if values:
+            query.where(field, *values)
+    if faults:
+        query.with_fault(*faults)
+    for field, bounds in (("Year", year), ("Mileage", mileage), ("Price", price)):
+        if bounds:
+            query.between(field, *bounds)
+    if sold is not None:
+        query.sold(sold)
+    return query
+
+# Expenditure index
+def index_expenditure(expenditure):
+    """Add a car expenditure to the per-VIN index and running totals."""
+    key = vin_key(expenditure.get("VIN"))
+    if not key:
+        return  # Miscellaneous spend is not tied to a car
+    expenditures_by_vin.setdefault(key, []).append(expenditure)
+    expenditure_totals[key] = expenditure_totals.get(key, 0.0) + to_float(expenditure.get("Amount"))
+
+def rebuild_expenditure_index():
+    expenditures_by_vin.clear()
+    expenditure_totals.clear()
+    for expenditure in expenditures:
+        index_expenditure(expenditure)
+
+def landed_cost(car):
+    """Purchase price plus everything spent on the car so far."""
+    return to_float(car.get("Price")) + expenditure_totals.get(vin_key(car.get("VIN")), 0.0)
+
+def display_value(value, default="N/A"):
+    return default if value is None or value != value else value
+
+ROLLUP_COLUMNS = [
+    ("VIN", "VIN", "text"),
+    ("Name", "Name", "text"),
+    ("Model", "Model", "text"),
+    ("Price", "Price", "money"),
+    ("Spent", "Expenditures", "money"),
+    ("Landed Cost", "LandedCost", "money"),
+    ("Sale Price", "SalesPrice", "money"),
+    ("True Profit", "TrueProfit", "money"),
+]
+
+@instrumented
+def expenditure_rollup():
+    """Join inventory, sales and car expenditures into one row per car.
+
+    Each row has the purchase price, total spend, landed cost and, for sold cars,
+    the sale price and true profit after tax and reconditioning.
+    """
+    columns = ["VIN", "Name", "Model", "Price", "Sold", "Expenditures", "LandedCost", "SalesPrice", "Tax", "TrueProfit"]
+    if not inventory:
+        # Typed like a full rollup, so the reports can still sum and rank it
+        return pd.DataFrame({column: pd.Series(dtype=object if column in ("VIN", "Name", "Model") else
+                                               bool if column == "Sold" else float) for column in columns})
+    cars = records_frame(inventory, ["VIN", "Name", "Model", "Price", "Sold"])
+    cars["key"] = cars["VIN"].map(vin_key)
+    cars["seq"] = [car.seq for car in inventory]
+    cars["Price"] = pd.to_numeric(cars["Price"], errors="coerce").fillna(0.0)
+
+    spend = pd.DataFrame(expenditures).reindex(columns=["VIN", "Amount"])
+    spend["key"] = spend["VIN"].map(vin_key)
+    spend["Amount"] = pd.to_numeric(spend["Amount"], errors="coerce").fillna(0.0)
+    spend = spend[spend["key"] != ""].groupby("key", as_index=False)["Amount"].sum()
+
+    # Sales join through the car they sold, not the VIN, which a bought-back car shares
+    sales = records_frame(sold_cars, ["SalesPrice", "Tax"])
+    sales["seq"] = pd.array([sale.vehicle.seq if cars_by_seq.get(sale.vehicle.seq) is sale.vehicle else None
+                             for sale in sold_cars], dtype="Int64")
+    sales = sales.dropna(subset=["seq"])
+
+    rollup = cars.merge(spend, on="key", how="left").merge(sales, on="seq", how="left")
+    rollup["Expenditures"] = rollup["Amount"].fillna(0.0)
+    rollup["LandedCost"] = rollup["Price"] + rollup["Expenditures"]
+    rollup["SalesPrice"] = pd.to_numeric(rollup["SalesPrice"], errors="coerce")
+    rollup["Tax"] = pd.to_numeric(rollup["Tax"], errors="coerce")
+    rollup["TrueProfit"] = rollup["SalesPrice"] - rollup["LandedCost"] - rollup["Tax"]
+    return rollup[columns]
+
+# Core operations, shared by the menus and the command line
+def add_user(username, password):
+    users[username] = hash_password(password)
+    commit_change("add_user", Username=username, Password=users[username])
+
+@instrumented
+def add_vehicle(stock_number, name, vehicle_model, vehicle_type, vin, vehicle_year, mileage, issues, price):
+    car = Vehicle(typed_fields({
+        "stock_number": stock_number,
+        "Name": name,
+        "Model": vehicle_model,
+        "Type": vehicle_type,
+        "Year": vehicle_year,
+        "VIN": vin,
+        "Mileage": mileage,
+        "Faults": issues,
+        "Price": price,
+        "Sold": False
+    }))
+    inventory.append(car)
+    index_car(car)
+    commit_change("add_car", car=car)
+    return car
+
+@instrumented
+def update_vehicle(car, changes):
+    changes = typed_fields(changes)
+    vin = car["VIN"]  # Replay checks the row against the VIN the car had before this change
+    change_car(car, changes)
+    commit_change("update_car", VIN=vin, row=car.seq, fields=changes)
+
+@instrumented
+def sell_vehicle(car, sales_price):
+    tax = sales_price * SALES_TAX
+    spent = expenditure_totals.get(vin_key(car["VIN"]), 0.0)
+    profit = sales_price - landed_cost(car) - tax  # Includes reconditioning spend
+
+    change_car(car, {"Sold": True})
+    sale = Sale(car, {
+        "SalesPrice": sales_price,
+        "Tax": tax,
+        "Profit": profit,
+        "Expenditures": spent,
+        "LandedCost": landed_cost(car),
+        "SaleDate": datetime.now().isoformat(timespec="seconds")
+    })
+    sold_cars.append(sale)
+    commit_change("sell_car", VIN=car["VIN"], row=car.seq, sale=sale)
+    record_sale_aggregates(sale)
+    if pending_changes is None:
+        save_sales_aggregates()  # A batch saves them once when it commits
+    return sale
+
+@instrumented
+def record_expenditure(amount, description, car=None):
+    """Record spend on a car, or miscellaneous spend when no car is given."""
+    if car:
+        expenditure = {"Type": "Car", "VIN": car["VIN"], "Amount": amount, "Description": description}
+    else:
+        expenditure = {"Type": "Miscellaneous", "Amount": amount, "Description": description}
+    expenditure["Date"] = datetime.now().isoformat(timespec="seconds")
+    expenditures.append(expenditure)
+    index_expenditure(expenditure)
+    commit_change("add_expenditure", expenditure=expenditure)
+    return expenditure
 
 def register_user():
     while True:
@@ -64,11 +2014,14 @@ def register_user():
             password = getpass.getpass("Enter a password: ")
             confirm_password = getpass.getpass("Confirm your password: ")
             if password == confirm_password:
-                users[username] = hash_password(password)
-                save_data()
-                print("User  registered successfully!")
-                time.sleep(1)
-                break
+                try:
+                    add_user(username, password)
+                except ServerError as e:  # Registered from another client meanwhile
+                    print(f"Registration failed: {e}")
+                else:
+                    print("User  registered successfully!")
+                    time.sleep(1)
+                    break
             else:
                 print("Passwords do not match. Please try again.")
         if input("Cancel registration? (y/n): ").lower() == 'y':
@@ -77,10 +2030,11 @@ def register_user():
             break
 
 def user_login():
+    """Return the username once someone logs in, or None if they choose to exit."""
     while True:
         clear_console()
         print("Welcome! Please log in or register to access the program.")
-        option = input("Do you want to (1) Log in or (2) Register? Enter 1 or 2: ")
+        option = input("Do you want to (1) Log in, (2) Register or (3) Exit? Enter 1, 2 or 3: ")
         if option == "1":
             username = input("Enter username: ").strip()
             password = getpass.getpass("Enter password: ")
@@ -89,23 +2043,70 @@ def user_login():
             if username in users and users[username] == hashed_password:
                 print(f"Login successful! Welcome {username}!")
                 time.sleep(1)
-                main_menu(username)  # Pass the username to the main menu
-                break
+                return username
             else:
                 print("Invalid credentials. Please try again.")
                 time.sleep(1)
         elif option == "2":
             show_transition("Navigating to Registration...")
+            wait_for_data()  # Registering writes to the data the background load is still reading
             register_user()
+        elif option == "3":
+            return None
         else:
-            print(" Invalid option. Please enter 1 or 2.")
+            print(" Invalid option. Please enter 1, 2 or 3.")
+
+# Navigation
+BACK = "back"  # Returned by a screen to go back to the screen that opened it
+SIGN_OUT = "sign_out"  # Returned by a screen to end the session
 
-def go_back(previous_function, *args):
+def go_back():
     """Handle backward navigation with transition."""
     show_transition("Returning to previous menu...")
-    previous_function(*args)  # Pass any additional arguments
+    return BACK
+
+def run_screens(session, start_screen):
+    """Drive every menu from one loop so the call stack stays flat however long the session runs.
+
+    Each screen is called with the session and returns the next screen to open, BACK
+    (or None) to return to the screen below it, or SIGN_OUT to end the session.
+    """
+    screens = [start_screen]
+    while screens:
+        try:
+            result = screens[-1](session)
+        except ServerError as e:
+            print(f"\nThe server refused the change: {e}")
+            input("Press Enter to continue.")
+            continue
+        if result == SIGN_OUT:
+            return
+        if result is None or result == BACK:
+            screens.pop()
+        else:
+            screens.append(result)
+
+def run_interactive(show_timings=False):
+    """Log users in and run their sessions until someone chooses to exit."""
+    preload_data()
+    startup_timings["login prompt (since start)"] = time.perf_counter() - STARTED_AT
+    while True:
+        username = user_login()
+        wait_for_data()
+        if show_timings:
+            print_startup_timings()
+            input("\nPress Enter to continue.")
+            show_timings = False
+        if username is None:
+            compact_data()
+            break
+        run_screens({"username": username}, main_menu)
+        if profiling:
+            report_profile()
+            if not profile_output:
+                input("\nPress Enter to continue.")
 
-def add_inventory():
+def add_inventory(session):
     while True:
         clear_console()
         print("Add Inventory Page")
@@ -129,35 +2130,25 @@ def add_inventory():
 
             price = float(input("Enter the price of the vehicle: "))
 
-            inventory.append({
-                "stock_number": stock_number,
-                "Name": name,
-                "Model": vehicle_model,
-                "Type": vehicle_type,
-                "Year": vehicle_year,
-                "VIN": vin,
-                "Mileage": mileage,
-                "Faults": issues,
-                "Price": price,
-                "Sold": False
-            })
-            save_data()
+            add_vehicle(stock_number, name, vehicle_model, vehicle_type, vin, vehicle_year, mileage, issues, price)
             print("Vehicle added successfully!")
             time.sleep(1)
         elif choice == "2":
-            go_back(main_menu, "User   ")  # Pass the username to go back
+            return go_back()
         else:
             print("Invalid choice. Try again.")
             time.sleep(1)
 
-def update_inventory():
+def update_inventory(session):
     while True:
         clear_console()
         print("Update Inventory Page")
-        vin_input = input("Enter the VIN (full or last 6 digits) of the vehicle to update: ")
-        
+        vin_input = input("Enter the VIN (full or last 6 digits) of the vehicle to update (or press Enter to go back): ")
+        if not vin_input.strip():
+            return BACK
+
         # Check for a match with either the full VIN or the last 6 digits
-        car = next((c for c in inventory if vin_input in c["VIN"][-6:] or vin_input == c["VIN"]), None)
+        car = resolve_vin(vin_input)
 
         if car:
             print("Current details:")
@@ -173,46 +2164,47 @@ def update_inventory():
             print("8. Remove Fault")
             print("9. Go Back")
 
+            changes = {}
             choice = input("Select an option: ")
             if choice == "1":
                 new_name = input("Enter new vehicle name: ")
-                car["Name"] = new_name
+                changes["Name"] = new_name
                 print("Vehicle name updated successfully!")
             elif choice == "2":
                 new_model = input("Enter new vehicle model: ")
-                car["Model"] = new_model
+                changes["Model"] = new_model
                 print("Vehicle model updated successfully!")
             elif choice == "3":
                 new_type = input("Enter new vehicle type: ")
-                car["Type"] = new_type
+                changes["Type"] = new_type
                 print("Vehicle type updated successfully!")
             elif choice == "4":
                 new_year = input("Enter new vehicle year: ")
-                car["Year"] = new_year
+                changes["Year"] = new_year
                 print("Vehicle year updated successfully!")
             elif choice == "5":
                 new_mileage = input("Enter new mileage: ")
-                car["Mileage"] = new_mileage
+                changes["Mileage"] = new_mileage
                 print("Mileage updated successfully!")
             elif choice == "6":
                 new_faults = input("Enter new faults (if any, comma-separated): ")
-                car["Faults"] = new_faults.split(',') if new_faults else []
+                changes["Faults"] = normalize_faults(new_faults)
                 print("Faults updated successfully!")
             elif choice == "7":
                 while True:
                     try:
                         new_price = float(input("Enter new price: "))
-                        car["Price"] = new_price
+                        changes["Price"] = new_price
                         print("Price updated successfully!")
                         break
                     except ValueError:
                         print("Invalid input. Please enter a numeric value for the price.")
             elif choice == "8":
                 if "Faults" in car and car["Faults"]:
-                    print("Current faults:", car["Faults"])
-                    fault_to_remove = input("Enter the fault to remove: ")
+                    print("Current faults:", ", ".join(car["Faults"]))
+                    fault_to_remove = " ".join(input("Enter the fault to remove: ").split()).casefold()
                     if fault_to_remove in car["Faults"]:
-                        car["Faults"].remove(fault_to_remove)
+                        changes["Faults"] = [fault for fault in car["Faults"] if fault != fault_to_remove]
                         print("Fault removed successfully!")
                     else:
                         print("Fault not found.")
@@ -223,6 +2215,9 @@ def update_inventory():
             else:
                 print("Invalid choice. Please try again.")
 
+            if changes:
+                update_vehicle(car, changes)
+
             # Ask if the user wants to edit the vehicle again
             edit_again = input("Do you want to edit this vehicle again? (y/n): ")
             if edit_again.lower() != 'y':
@@ -231,7 +2226,7 @@ def update_inventory():
             print("Vehicle not found. Please try again.")
             time.sleep(1)
 
-def add_expenditure():
+def add_expenditure(session):
     while True:
         clear_console()
         print("Add Expenditure Page")
@@ -243,60 +2238,66 @@ def add_expenditure():
         choice = input("Select an option: ")
         if choice == "1":
             vin = input("Enter the VIN (full or last 6 digits) of the vehicle: ")
-            car = next((c for c in inventory if vin in c["VIN"][-6:] or vin == c["VIN"]), None)
+            car = resolve_vin(vin)
 
             if car:
                 amount = float(input("Enter the amount spent: "))
-                expenditures.append({
-                    "Type": "Car",
-                    "VIN": car["VIN"],
-                    "Amount": amount,
-                    "Description": input("Enter a description for the expenditure: ")
-                })
-                print("Expenditure for the car updated.")
+                record_expenditure(amount, input("Enter a description for the expenditure: "), car)
+                print(f"Expenditure for the car updated. Landed cost is now ${landed_cost(car):.2f}.")
             else:
                 print("Car not found.")
             time.sleep(1)
         elif choice == "2":
             amount = float(input("Enter the amount spent: "))
-            expenditures.append({
-                "Type": "Miscellaneous",
-                "Amount": amount,
-                "Description": input("Enter a description for the expenditure: ")
-            })
+            record_expenditure(amount, input("Enter a description for the expenditure: "))
             print("Miscellaneous expenditure updated.")
             time.sleep(1)
         elif choice == "3":
-            print_expenditure_report()  # Call the report function
+            return print_expenditure_report  # Open the report screen
         elif choice == "4":
-            go_back(main_menu, "User    ")  # Pass the username to go back
+            return go_back()
         else:
             print("Invalid choice. Try again.")
             time.sleep(1)
 
-def print_expenditure_report():
+def print_expenditure_report(session):
     clear_console()
     print("Expenditure Report")
     print("1. View All Expenditures")
-    print("2. Go Back")
+    print("2. Cost Rollup by Car")
+    print("3. Go Back")
 
     choice = input("Select an option: ")
     if choice == "1":
         if expenditures:
-            for exp in expenditures:
-                print(f"Type: {exp['Type']}, VIN: {exp['VIN']}, Amount: ${exp['Amount']:.2f}, Description: {exp['Description']}")
+            key = report_key("expenditures", None, "expenditures")
+            print(cached_report(key, expenditure_report_text))
             save_choice = input("\nSave this report as a PDF? (y/n): ").lower()
             if save_choice == "y":
-                save_report_to_pdf("Expenditure Report", [f"Type: {exp['Type']}, VIN: {exp['VIN']}, Amount: ${exp['Amount']:.2f}, Description: {exp['Description']}" for exp in expenditures], "expenditure_report.pdf")
+                write_table_pdf("Expenditure Report", EXPENDITURE_COLUMNS, expenditures, "expenditure_report.pdf",
+                                total_columns=("Amount",), cache_key=key)
         else:
             print("No expenditures found.")
+        input("\nPress Enter to return to the expenditure menu.")
     elif choice == "2":
-        go_back(add_expenditure, "User    ")  # Go back to the add expenditure menu
+        key = report_key("rollup", None, "inventory", "sold_cars", "expenditures")
+        rollup = cached_report(key + ("frame",), expenditure_rollup)
+        print(cached_report(key, partial(rollup_report_text, rollup)))
+
+        save_choice = input("\nSave the full rollup as a PDF? (y/n): ").lower()
+        if save_choice == "y":
+            # A generator, so the rows are only built if the PDF is not already cached
+            rows = (row._asdict() for row in rollup.itertuples(index=False))
+            write_table_pdf("Cost Rollup by Car", ROLLUP_COLUMNS, rows, "cost_rollup_report.pdf",
+                            total_columns=("Expenditures", "LandedCost", "TrueProfit"), cache_key=key)
+        input("\nPress Enter to return to the expenditure menu.")
+    elif choice == "3":
+        return go_back()  # Back to the add expenditure menu
     else:
         print("Invalid choice. Please try again.")
         time.sleep(1)
 
-def sell_car():
+def sell_car(session):
     while True:
         clear_console()
         print("Sell Car Page")
@@ -306,193 +2307,653 @@ def sell_car():
         choice = input("Select an option: ")
         if choice == "1":
             vin = input("Enter the VIN (full or last 6 digits) of the car to mark as sold: ")
-            car = next((c for c in inventory if vin in c["VIN"] and not c["Sold"]), None)
+            car = resolve_vin(vin, unsold_only=True)
 
             if car:
                 sales_price = float(input("Enter the sales price: "))
-                tax = sales_price * SALES_TAX
-                profit = sales_price - car["Price"] - tax
-
-                car["Sold"] = True
-                sold_cars.append({
-                    **car,
-                    "SalesPrice": sales_price,
-                    "Tax": tax,
-                    "Profit": profit
-                })
-                save_data()
+                sell_vehicle(car, sales_price)
                 print("Car marked as sold and database updated.")
                 time.sleep(1)
             else:
                 print("Car not found or already sold.")
                 time.sleep(1)
         elif choice == "2":
-            go_back(main_menu, "User    ")  # Pass the username to go back
+            return go_back()
         else:
             print("Invalid choice. Try again.")
             time.sleep(1)
 
-def import_inventory():
-    global inventory
+# Sales aggregates
+def new_sales_aggregates():
+    return {"totals": new_sales_bucket(), "by_day": {}, "by_month": {}, "by_type": {}, "by_model": {}}
+
+def new_sales_bucket():
+    return {"Count": 0, "Sales": 0.0, "Tax": 0.0, "Profit": 0.0}
+
+def bucket_label(value):
+    if value is None or value != value or str(value).strip() == "":
+        return "Unknown"
+    return str(value).strip()
+
+def sale_buckets(sale):
+    """The (group, key) pairs a sale counts towards."""
+    sale_date = bucket_label(sale.get("SaleDate"))
+    day = sale_date[:10] if len(sale_date) >= 10 else "Unknown"
+    month = day[:7] if day != "Unknown" else "Unknown"
+    return [("by_day", day), ("by_month", month),
+            ("by_type", bucket_label(sale.get("Type"))), ("by_model", bucket_label(sale.get("Model")))]
+
+def record_sale_aggregates(sale):
+    """Add one sale to the running totals; O(1) regardless of the sales history."""
+    amounts = {"Sales": to_float(sale.get("SalesPrice")), "Tax": to_float(sale.get("Tax")), "Profit": to_float(sale.get("Profit"))}
+    buckets = [sales_aggregates["totals"]]
+    buckets += [sales_aggregates[group].setdefault(key, new_sales_bucket()) for group, key in sale_buckets(sale)]
+    for bucket in buckets:
+        bucket["Count"] += 1
+        for name, amount in amounts.items():
+            bucket[name] += amount
+
+def save_sales_aggregates():
+    if storage.name == "remote":
+        return  # The server keeps the totals
+    tmp_path = SALES_SUMMARY_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(sales_aggregates, f)
+    os.replace(tmp_path, SALES_SUMMARY_FILE)
+
+def load_sales_aggregates():
+    """Load the persisted totals, rebuilding them if they do not cover every sale on record."""
+    global sales_aggregates
+    if storage.name == "remote":
+        sales_aggregates = storage.sales_aggregates
+        return
+    try:
+        with open(SALES_SUMMARY_FILE, encoding="utf-8") as f:
+            sales_aggregates = json.load(f)
+    except (OSError, ValueError):
+        sales_aggregates = new_sales_aggregates()
+    if sales_aggregates.get("totals", {}).get("Count") != len(sold_cars) + archived_count("sold_cars"):
+        rebuild_sales_aggregates()
+        save_sales_aggregates()
+
+@instrumented
+def rebuild_sales_aggregates():
+    """Recompute every sales bucket from the full sales history, archives included, with a pandas groupby."""
+    global sales_aggregates
+    aggregates = new_sales_aggregates()
+    sales = list(all_sales())
+    if sales:
+        df = records_frame(sales, ["SalesPrice", "Tax", "Profit", "SaleDate", "Type", "Model"])
+
+        def numeric(name):
+            return pd.to_numeric(df[name], errors="coerce").fillna(0.0) if name in df else 0.0
+
+        def labels(name):
+            values = df[name].fillna("").astype(str).str.strip() if name in df else pd.Series("", index=df.index)
+            return values.where(values != "", "Unknown")
+
+        dates = labels("SaleDate")
+        frame = pd.DataFrame({
+            "Sales": numeric("SalesPrice"),
+            "Tax": numeric("Tax"),
+            "Profit": numeric("Profit"),
+            "by_day": dates.str[:10].where(dates.str.len() >= 10, "Unknown"),
+            "by_type": labels("Type"),
+            "by_model": labels("Model"),
+        }, index=df.index)
+        frame["by_month"] = frame["by_day"].str[:7].where(frame["by_day"] != "Unknown", "Unknown")
+
+        sums = frame[["Sales", "Tax", "Profit"]].sum()
+        aggregates["totals"] = {"Count": len(frame), **{name: float(sums[name]) for name in ("Sales", "Tax", "Profit")}}
+        for group in ("by_day", "by_month", "by_type", "by_model"):
+            grouped = frame.groupby(group)[["Sales", "Tax", "Profit"]].sum()
+            counts = frame.groupby(group).size()
+            aggregates[group] = {
+                key: {"Count": int(counts[key]), "Sales": float(row["Sales"]), "Tax": float(row["Tax"]), "Profit": float(row["Profit"])}
+                for key, row in grouped.iterrows()
+            }
+    sales_aggregates = aggregates
+
+@instrumented
+def audit_sales_aggregates():
+    """Rebuild the totals from scratch and return the buckets that had drifted."""
+    running = sales_aggregates
+    rebuild_sales_aggregates()
+    drifted = []
+    for group in ("totals", "by_day", "by_month", "by_type", "by_model"):
+        old = {"": running.get("totals", {})} if group == "totals" else running.get(group, {})
+        new = {"": sales_aggregates["totals"]} if group == "totals" else sales_aggregates[group]
+        for key in sorted(set(old) | set(new)):
+            before, after = old.get(key, new_sales_bucket()), new.get(key, new_sales_bucket())
+            if any(abs(to_float(before.get(name)) - after[name]) > 0.005 for name in ("Count", "Sales", "Tax", "Profit")):
+                drifted.append(f"{group} {key}".strip())
+    save_sales_aggregates()
+    if drifted:
+        bump_data_versions("sold_cars")  # Reports built from the drifted totals are stale
+    return drifted
+
+@instrumented
+def expenditure_report_text():
+    return "\n".join(
+        f"Type: {exp.get('Type', 'N/A')}, VIN: {display_value(exp.get('VIN'))}, "
+        f"Amount: ${to_float(exp.get('Amount')):.2f}, Description: {display_value(exp.get('Description'), '')}"
+        for exp in expenditures)
+
+def rollup_report_text(rollup):
+    """Spend totals, the biggest cost sinks and the least profitable sales from an expenditure rollup."""
+    misc_total = sum(to_float(exp.get("Amount")) for exp in expenditures if not vin_key(exp.get("VIN")))
+    lines = [f"Spent on cars: ${rollup['Expenditures'].sum():.2f}",
+             f"Miscellaneous spend: ${misc_total:.2f}",
+             "\nTop cost sinks:"]
+    sinks = rollup[rollup["Expenditures"] > 0].nlargest(10, "Expenditures")
+    for row in sinks.itertuples():
+        lines.append(f"  {row.VIN} {display_value(row.Name, '')} {display_value(row.Model, '')}: spent ${row.Expenditures:.2f}, "
+                     f"landed cost ${row.LandedCost:.2f}")
+    if sinks.empty:
+        lines.append("  No car expenditures recorded.")
+
+    sold = rollup[rollup["SalesPrice"].notna()]
+    if not sold.empty:
+        lines.append(f"\nTrue profit on sold cars: ${sold['TrueProfit'].sum():.2f}")
+        lines.append("Lowest true profit:")
+        for row in sold.nsmallest(10, "TrueProfit").itertuples():
+            lines.append(f"  {row.VIN} {display_value(row.Name, '')} {display_value(row.Model, '')}: sold ${row.SalesPrice:.2f}, "
+                         f"landed cost ${row.LandedCost:.2f}, true profit ${row.TrueProfit:.2f}")
+    return "\n".join(lines)
+
+def sales_report_lines():
+    """Totals plus month, type and model breakdowns, read from the running aggregates."""
+    totals = sales_aggregates["totals"]
+    lines = [
+        f"Total Sales: ${totals['Sales']:.2f}\n",
+        f"Total Tax: ${totals['Tax']:.2f}\n",
+        f"Total Profit: ${totals['Profit']:.2f}\n",
+        f"Cars Sold: {totals['Count']}\n",
+    ]
+    for group, heading in (("by_month", "By Month"), ("by_type", "By Type"), ("by_model", "By Model")):
+        if sales_aggregates[group]:
+            lines.append(f"\n{heading}:\n")
+            for key, bucket in sorted(sales_aggregates[group].items()):
+                lines.append(f"  {key}: {bucket['Count']} sold, Sales ${bucket['Sales']:.2f}, "
+                             f"Tax ${bucket['Tax']:.2f}, Profit ${bucket['Profit']:.2f}\n")
+    return lines
+
+# Bulk import
+COLUMN_ALIASES = {  # Normalized source header -> inventory column
+    "stocknumber": "stock_number", "stock": "stock_number", "stockno": "stock_number",
+    "name": "Name", "make": "Name",
+    "model": "Model",
+    "type": "Type", "bodytype": "Type", "vehicletype": "Type",
+    "year": "Year", "modelyear": "Year",
+    "vin": "VIN",
+    "mileage": "Mileage", "odometer": "Mileage", "odometermileage": "Mileage", "miles": "Mileage",
+    "faults": "Faults", "issues": "Faults",
+    "price": "Price", "cost": "Price", "purchaseprice": "Price",
+    "sold": "Sold",
+}
+TRUE_VALUES = ["true", "yes", "y", "1"]
+IMPORT_CHUNK_SIZE = 5000  # Rows read and validated at a time
+IMPORT_REJECTS_FILE = "import_rejects.csv"
+
+def read_import_chunks(file_path, chunk_size=IMPORT_CHUNK_SIZE):
+    """Yield the rows of an xlsx or CSV file as DataFrames of at most chunk_size rows."""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        yield from pd.read_csv(file_path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+    elif extension in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(value) if value is not None else "" for value in next(rows, [])]
+            offset = 0
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                # Number rows across chunks the same way read_csv does
+                yield pd.DataFrame(chunk, columns=header, index=range(offset, offset + len(chunk)))
+                offset += len(chunk)
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Unsupported file type '{extension}'; use .xlsx or .csv")
+
+def normalize_import_chunk(chunk):
+    """Map a chunk onto the inventory columns with vectorized coercion.
+
+    Returns the normalized rows, the VIN and reject reason of each row that failed
+    validation, and the inventory columns the source actually provided.
+    """
+    renamed = {}
+    for column in chunk.columns:
+        target = COLUMN_ALIASES.get("".join(ch for ch in str(column).lower() if ch.isalnum()))
+        if target and target not in renamed.values():
+            renamed[column] = target
+    chunk = chunk[list(renamed)].rename(columns=renamed)
+
+    normalized = pd.DataFrame(index=chunk.index)
+    for column in ("stock_number", "Name", "Model", "Type", "VIN"):
+        if column in chunk:
+            normalized[column] = chunk[column].fillna("").astype(str).str.strip()
+        else:
+            normalized[column] = ""
+    normalized["stock_number"] = normalized["stock_number"].str.replace(r"\.0$", "", regex=True)  # Excel's 72.0 for 72
+    for column in ("Year", "Mileage"):
+        # Whole numbers are stored as ints, like add_vehicle does; anything else is kept as text
+        values = chunk[column] if column in chunk else pd.Series("", index=chunk.index)
+        numbers = pd.to_numeric(values, errors="coerce")
+        if not pd.api.types.is_numeric_dtype(values):  # Read "80,000" and "$19,500" the way parse_number() does
+            cleaned = values.astype(str).str.strip().str.replace(",", "", regex=False).str.lstrip("$")
+            numbers = numbers.fillna(pd.to_numeric(cleaned, errors="coerce"))
+        typed = values.fillna("").astype(str).str.strip().astype(object)
+        whole = numbers.notna() & (numbers % 1 == 0)
+        typed[whole] = numbers[whole].astype("int64").tolist()
+        normalized[column] = typed
+    if "Faults" in chunk:
+        normalized["Faults"] = chunk["Faults"].map(normalize_faults)
+    else:
+        normalized["Faults"] = [[] for _ in range(len(chunk))]
+    if "Price" in chunk:
+        prices = chunk["Price"].fillna("").astype(str).str.replace(r"[$,\s]", "", regex=True)
+        normalized["Price"] = pd.to_numeric(prices, errors="coerce").astype(float)
+    else:
+        normalized["Price"] = float("nan")
+    if "Sold" in chunk:
+        normalized["Sold"] = chunk["Sold"].fillna("").astype(str).str.strip().str.lower().isin(TRUE_VALUES)
+    else:
+        normalized["Sold"] = False
+
+    reasons = pd.Series("", index=chunk.index)
+    reasons[normalized["Price"].isna()] = "missing or non-numeric Price"
+    reasons[normalized["VIN"] == ""] = "missing VIN"
+    valid = reasons == ""
+    rejected = pd.DataFrame({"VIN": normalized["VIN"], "reason": reasons})[~valid]
+    return normalized[valid][CAR_COLUMNS], rejected, list(chunk.columns)
+
+def is_blank(value):
+    return value is None or value != value or (isinstance(value, (str, list)) and not value)
+
+@instrumented
+def import_vehicles(file_path, chunk_size=IMPORT_CHUNK_SIZE):
+    """Import an xlsx or CSV feed in chunks, adding new VINs and updating changed ones.
+
+    Everything is validated before anything is applied, and the whole import is persisted
+    as a single change. Returns counts plus a list of (row number, VIN, reason) rejects.
+    """
+    added, updates, rejects = [], [], []
+    unchanged = 0
+    seen = set()  # VINs already taken from this file
+    for chunk in read_import_chunks(file_path, chunk_size):
+        rows, rejected, provided = normalize_import_chunk(chunk)
+        for row_index, vin, reason in rejected.itertuples():
+            rejects.append((row_index + 2, vin, reason))  # +2: header row and 1-based numbering
+
+        for row_index, row in zip(rows.index, rows.to_dict('records')):
+            key = vin_key(row["VIN"])
+            if key in seen:
+                rejects.append((row_index + 2, row["VIN"], "duplicate VIN in file"))
+                continue
+            seen.add(key)
+            # Only a car still in stock is updated; a sold one is history, and its VIN coming
+            # back in a feed means the car was bought back
+            car = next((c for c in vin_index.get(key, []) if not c.get("Sold", False)), None)
+            if car is None:
+                added.append(Vehicle(row))
+                continue
+            # A blank cell means the row does not set that column, e.g. a price-only row in a mixed feed
+            changes = {column: row[column] for column in provided
+                       if not is_blank(row[column]) and car.get(column) != row[column]}
+            if changes:
+                updates.append((car, changes))
+            else:
+                unchanged += 1
+
+    rejects.sort()
+    inventory.extend(added)
+    index_cars(added)
+    journaled = [{"VIN": car["VIN"], "row": car.seq, "fields": changes} for car, changes in updates]
+    for car, changes in updates:
+        change_car(car, changes)
+    if added or updates:
+        commit_change("import_cars", cars=added, updates=journaled)
+    return {"added": len(added), "updated": len(updates), "unchanged": unchanged, "rejects": rejects}
+
+def print_import_result(result):
+    print(f"Imported {result['added']} new vehicles, updated {result['updated']}, "
+          f"{result['unchanged']} already up to date.")
+    rejects = result["rejects"]
+    if rejects:
+        print(f"{len(rejects)} rows were rejected:")
+        for row_number, vin, reason in rejects[:20]:
+            print(f"  Row {row_number}: {reason}" + (f" (VIN {vin})" if vin else ""))
+        pd.DataFrame(rejects, columns=["Row", "VIN", "Reason"]).to_csv(IMPORT_REJECTS_FILE, index=False)
+        print(f"All rejected rows were written to {IMPORT_REJECTS_FILE}.")
+
+def import_inventory(session):
     while True:
         clear_console()
         print("Import Inventory Page")
-        file_path = input("Enter the file path of the Excel file to import: ")
+        file_path = input("Enter the file path of the Excel or CSV file to import: ").strip()
 
         try:
-            imported_data = pd.read_excel(file_path).to_dict('records')
-            inventory.extend(imported_data)
-            save_data()
-            print(f"Successfully imported {len(imported_data)} vehicles into inventory.")
+            print_import_result(import_vehicles(file_path))
         except Exception as e:
             print(f"Error importing file: {e}")
 
         if input("Go back? (y/n): ").lower() == 'y':
             break
 
-def print_reports():
+def print_reports(session):
     while True:
         clear_console()
         print("Print Reports Page")
         print("1. View All Inventory")
         print("2. Report by VIN")
         print("3. Report by Total Sales")
-        print("4. Go Back")
+        print("4. Audit Sales Totals")
+        print("5. Fault Counts")
+        print("6. Go Back")
 
         choice = input("Select an option: ")
         if choice == "1":
-            if os.path.exists(INVENTORY_FILE):
-                inventory_data = pd.read_excel(INVENTORY_FILE).to_dict('records')
-                if not inventory_data:
-                    print("No vehicles found in inventory.")
-                else:
-                    report_content = []
-                    total_value = 0.0
-                    for idx, car in enumerate(inventory_data, start=1):
-                        report_content.append(
-                            f"{idx}.\n"
-                            f"Name: {car.get('Name', 'N/A')}\n"
-                            f"Model: {car.get('Model', 'N/A')}\n"
-                            f"Type: {car.get('Type', 'N/A')}\n"
-                            f"Year: {car.get('Year', 'N/A')}\n"
-                            f"VIN: {car.get('VIN', 'N/A')}\n"
-                            f"Mileage: {car.get('Mileage', 'N/A')}\n"
-                            f"Faults: {', '.join(car.get('Faults', []))}\n"
-                            f"Price: ${car.get('Price', 0.0):.2f}\n"
-                            f"Sold: {car.get('Sold', False)}\n"
-                        )
-                        total_value += car.get('Price', 0.0)
-                    print("\n".join(report_content))
-                    print(f"Total Inventory Value: ${total_value:.2f}")
-                    save_choice = input("\nSave this report as a PDF? (y/n): ").lower()
-                    if save_choice == "y":
-                        save_report_to_pdf("Inventory Report", report_content, "inventory_report.pdf")
+            inventory_data = current_inventory()
+            if not inventory_data:
+                print("No vehicles found in inventory.")
             else:
-                print("Inventory file not found.")
+                key = report_key("inventory", True, "inventory")  # current_inventory() lists sold cars too
+                total_value = cached_report(key + ("value",), lambda: sum(car.get('Price', 0.0) for car in inventory_data))
+                browse_cars(f"Inventory Report (Total Inventory Value: ${total_value:.2f})", current_inventory)
+                print(f"Total Inventory Value: ${total_value:.2f}")
+                save_choice = input("\nSave this report as a PDF? (y/n): ").lower()
+                if save_choice == "y":
+                    write_table_pdf("Inventory Report", INVENTORY_COLUMNS, current_inventory(), "inventory_report.pdf",
+                                    total_columns=("Price",), cache_key=key)
             input("\nPress Enter to return to the reports menu.")
         elif choice == "2":
             vin = input("Enter VIN (full or last 6 digits): ").strip()
-            inventory_data = pd.read_excel(INVENTORY_FILE).to_dict('records')
-            car = next((c for c in inventory if vin in c["VIN"][-6:] or vin == c["VIN"]), None)
+            refresh_data()
+            car = resolve_vin(vin, archived=True)
             if car:
-                report_content = [
-                    f"Name: {car.get('Name', 'N/A')}\n",
-                    f"Model: {car.get('Model', 'N/A')}\n",
-                    f"Type: {car.get('Type', 'N/A')}\n",
-                    f"Year: {car.get('Year', 'N/A')}\n",
-                    f"VIN: {car.get('VIN', 'N/A')}\n",
-                    f"Mileage: {car.get('Mileage', 'N/A')}\n",
-                    f"Faults: {', '.join(car.get('Faults', []))}\n",
-                    f"Price: ${car.get('Price', 0.0):.2f}\n",
-                    f"Sold: {car.get('Sold', False)}"
-                ]
+                key = vin_report_key(vin, car)
+                report_content = cached_report(key, partial(vin_report_lines, car))
                 print("".join(report_content))
                 save_choice = input("\nSave this report as a PDF? (y/n): ").lower()
                 if save_choice == "y":
-                    save_report_to_pdf(f"Report for VIN {vin}", report_content, "vin_report.pdf")
+                    save_report_to_pdf(f"Report for VIN {vin}", report_content, "vin_report.pdf", cache_key=key)
             else:
                 print("No vehicle found with the provided VIN.")
             input("\nPress Enter to return to the reports menu.")
         elif choice == "3":
-            sold_data = pd.read_excel(SOLD_CARS_FILE).to_dict('records')
-            total_sales = sum(car.get("SalesPrice", 0.0) for car in sold_data)
-            total_tax = sum(car.get("Tax", 0.0) for car in sold_data)
-            total_profit = sum(car.get("Profit", 0.0) for car in sold_data)
-
-            report_content = [
-                f"Total Sales: ${total_sales:.2f}\n",
-                f"Total Tax: ${total_tax:.2f}\n",
-                f"Total Profit: ${total_profit:.2f}"
-            ]
-            print("\n".join(report_content))
+            refresh_data()
+            key = report_key("sales", None, "sold_cars")
+            report_content = cached_report(key, sales_report_lines)
+            print("".join(report_content))
             save_choice = input("\nSave this report as a PDF? (y/n): ").lower()
             if save_choice == "y":
-                save_report_to_pdf("Sales Summary Report", report_content, "sales_summary_report.pdf")
+                write_table_pdf("Sales Summary Report", SALES_COLUMNS, current_sold_cars(), "sales_summary_report.pdf",
+                                total_columns=("SalesPrice", "Tax", "Profit"), summary_lines=report_content, cache_key=key)
             input("\nPress Enter to return to the reports menu.")
         elif choice == "4":
-            go_back(main_menu, "User     ")  # Pass the username to go back
+            refresh_data()
+            drifted = audit_sales_aggregates()
+            if drifted:
+                print("Running totals differed from the sales history and were rebuilt for:")
+                for name in drifted:
+                    print(f"  {name}")
+            else:
+                print("Running totals match the full sales history.")
+            input("\nPress Enter to return to the reports menu.")
+        elif choice == "5":
+            refresh_data()
+            key = report_key("faults", True, "inventory")
+            report_content = cached_report(key, fault_report_lines)
+            print("".join(report_content))
+            save_choice = input("\nSave this report as a PDF? (y/n): ").lower()
+            if save_choice == "y":
+                save_report_to_pdf("Fault Counts", report_content, "fault_report.pdf", cache_key=key)
+            input("\nPress Enter to return to the reports menu.")
+        elif choice == "6":
+            return go_back()
         else:
             print("Invalid choice. Please try again.")
             time.sleep(1)
 
-def view_inventory(show_all=False):
-    while True:
-        clear_console()
-        print("View Inventory Page")
+def view_inventory(session, show_all=False):
+    # Served from memory; reloaded only if the files changed on disk
+    browse_cars("View Inventory Page", lambda: current_inventory(show_all), indent="   ")
 
-        # Reload inventory from inventory.xlsx
-        if os.path.exists(INVENTORY_FILE):
-            inventory_data = pd.read_excel(INVENTORY_FILE).to_dict('records')
-        else:
-            print("No inventory data found.")
-            if input("Go back? (y/n): ").lower() == 'y':
-                break
-            continue
+@instrumented
+def search_inventory(session):
+    """Ask for search filters, then page through the matching cars."""
+    clear_console()
+    print("Search Inventory Page (press Enter to skip a filter)")
+    types = [value.strip() for value in input("Type(s), comma-separated: ").split(",") if value.strip()]
+    models = [value.strip() for value in input("Model(s), comma-separated: ").split(",") if value.strip()]
+    names = [value.strip() for value in input("Name(s), comma-separated: ").split(",") if value.strip()]
+    faults = normalize_faults(input("Fault(s) or words of one, comma-separated: "))
+    try:
+        year = parse_range(input("Year, e.g. 2018-2021: "))
+        mileage = parse_range(input("Mileage, e.g. -80000: "))
+        price = parse_range(input("Price, e.g. 5000-20000: "))
+    except ValueError as e:
+        print(f"Error: {e}")
+        input("\nPress Enter to go back.")
+        return BACK
+    status = input("Show (u)nsold, (s)old or (a)ll cars? [u]: ").strip().lower()
+    sold = None if status == "a" else status == "s"
 
-        inventory_to_display = inventory_data if show_all else [car for car in inventory_data if not car.get("Sold", False)]
+    query = build_query(types, models, names, year, mileage, price, sold, faults)
+    refresh_data()
+    matches = query.cars()
+    if not matches:
+        print("No vehicles match that search.")
+        input("\nPress Enter to go back.")
+        return BACK
+    browse_cars(f"Search Results ({len(matches)} vehicles)", lambda: matches, indent="   ")
+    return BACK
 
-        if not inventory_to_display:
-            print("No vehicles to display.")
-        else:
-            for idx, car in enumerate(inventory_to_display, start=1):
-                print(
-                    f"{idx}.\n"
-                    f"   Name: {car.get('Name', 'N/A')}\n"
-                    f"   Model: {car.get('Model', 'N/A')}\n"
-                    f"   Type: {car.get('Type', 'N/A')}\n"
-                    f"   Year: {car.get('Year', 'N/A')}\n"
-                    f"   VIN: {car.get('VIN', 'N/A')}\n"
-                    f"   Mileage: {car.get('Mileage', 'N/A')}\n"
-                    f"   Faults: {', '.join(car.get('Faults', []))}\n"
-                    f"   Price: ${car.get('Price', 0.0):.2f}\n"
-                    f"   Sold: {car.get('Sold', False)}\n"
-                )
-
-        if input("Go back? (y/n): ").lower() == 'y':
-            break
+def save_report_to_pdf(report_title, report_content, filename="report.pdf", cache_key=None):
+    write_pdf(filename, partial(render_text_pdf, report_title, report_content), cache_key)
 
-def save_report_to_pdf(report_title, report_content, filename="report.pdf"):
+def render_text_pdf(report_title, report_content):
+    from fpdf import FPDF  # Imported on first use; most sessions never make a PDF
     pdf = FPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
-    pdf.set_font("Times New Roman", size=12)
-    
-    pdf.set_font("Times New Roman", style="B", size=16)
+    pdf.set_font("Times", style="B", size=16)  # "Times New Roman" is not one of the core PDF fonts
     pdf.cell(0, 10, report_title, ln=True, align="C")
     pdf.ln(10)  # Add a line break
 
     pdf.set_font("Arial", size=12)
     for line in report_content:
         pdf.multi_cell(0, 10, line)
-    
+    return pdf_bytes(pdf)
+
+def write_file_atomic(path, data):
+    """Write bytes to path so readers see either the old file or the complete new one."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def pdf_bytes(pdf):
+    data = pdf.output(dest="S")
+    return data.encode("latin-1") if isinstance(data, str) else bytes(data)  # fpdf 1.x returns a str
+
+def write_pdf(filename, render, cache_key=None):
+    """Write the PDF that render() returns to filename, atomically.
+
+    With a cache key (see report_key) an unchanged report is rendered once per process,
+    and a file we already wrote for it is left alone while it is untouched on disk.
+    """
     output_path = os.path.join(os.getcwd(), filename)
-    pdf.output(output_path)
+    if cache_key is None:
+        data = render()
+    else:
+        cache_key = ("pdf",) + cache_key
+        if written_pdfs.get(output_path) == (cache_key, file_signature(output_path)):
+            print(f"\nReport unchanged, PDF is up to date: {output_path}")
+            return
+        data = cached_report(cache_key, render)
+    write_file_atomic(output_path, data)
+    written_pdfs[output_path] = (cache_key, file_signature(output_path))
+    if profiling:
+        count_bytes(output_path, written=len(data))
     print(f"\nReport saved as PDF: {output_path}")
 
-def main_menu(username):
+# Table reports
+INVENTORY_COLUMNS = [
+    ("Stock #", "stock_number", "text"),
+    ("Name", "Name", "text"),
+    ("Model", "Model", "text"),
+    ("Type", "Type", "text"),
+    ("Year", "Year", "text"),
+    ("VIN", "VIN", "text"),
+    ("Mileage", "Mileage", "text"),
+    ("Faults", "Faults", "text"),
+    ("Price", "Price", "money"),
+    ("Sold", "Sold", "text"),
+]
+SALES_COLUMNS = [
+    ("Name", "Name", "text"),
+    ("Model", "Model", "text"),
+    ("Year", "Year", "text"),
+    ("VIN", "VIN", "text"),
+    ("Sale Price", "SalesPrice", "money"),
+    ("Tax", "Tax", "money"),
+    ("Profit", "Profit", "money"),
+]
+EXPENDITURE_COLUMNS = [
+    ("Type", "Type", "text"),
+    ("VIN", "VIN", "text"),
+    ("Amount", "Amount", "money"),
+    ("Description", "Description", "text"),
+    ("Date", "Date", "text"),
+]
+TABLE_SAMPLE_ROWS = 200  # Rows used to measure column widths before the table is laid out
+TABLE_ROW_HEIGHT = 5
+
+def to_float(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if number != number else number  # NaN from empty cells
+
+def cell_text(record, key, kind):
+    value = record.get(key)
+    if value is None or value != value:
+        return ""
+    if kind == "money":
+        return f"${to_float(value):,.2f}"
+    if isinstance(value, list):
+        value = ", ".join(str(item) for item in value)
+    # The core PDF fonts only cover Latin-1
+    return str(value).encode("latin-1", "replace").decode("latin-1")
+
+def write_table_pdf(report_title, columns, records, filename, total_columns=(), summary_lines=(), cache_key=None):
+    write_pdf(filename, partial(render_table_pdf, report_title, columns, records, total_columns, summary_lines), cache_key)
+
+@instrumented
+def render_table_pdf(report_title, columns, records, total_columns=(), summary_lines=()):
+    """Render records as a compact table, one row per record, and return the PDF bytes.
+
+    columns is a list of (header, key, kind) with kind "text" or "money". Records are
+    consumed lazily from any iterable: column widths are measured once from the headers
+    and the first TABLE_SAMPLE_ROWS rows, every page repeats the header row, and pages
+    end with subtotals for total_columns.
+    """
+    from fpdf import FPDF
+    pdf = FPDF(orientation="L" if len(columns) > 6 else "P")
+    pdf.set_auto_page_break(False)  # Page breaks are placed by hand so headers and subtotals fit
+    pdf.set_margins(10, 10)
+    pdf.set_font("Arial", size=8)
+    usable_width = pdf.w - 20
+    bottom = pdf.h - 10 - (2 * TABLE_ROW_HEIGHT if total_columns else TABLE_ROW_HEIGHT)
+
+    # Measure the columns once
+    records = iter(records)
+    sample = list(islice(records, TABLE_SAMPLE_ROWS))
+    widths = []
+    for header, key, kind in columns:
+        text_width = max([pdf.get_string_width(cell_text(r, key, kind)) for r in sample] or [0])
+        widths.append(max(pdf.get_string_width(header) + 2, min(text_width + 2, usable_width / 3)))
+    scale = min(1.0, usable_width / sum(widths))
+    widths = [width * scale for width in widths]
+    char_width = pdf.get_string_width("0")
+    max_chars = [max(3, int(width / char_width)) for width in widths]
+
+    totals = {key: 0.0 for key in total_columns}
+    page_totals = dict(totals)
+    page_number = 0
+
+    def totals_row(label, values):
+        pdf.set_font("Arial", style="B", size=8)
+        for idx, (header, key, kind) in enumerate(columns):
+            text = f"${values[key]:,.2f}" if key in values else (label if idx == 0 else "")
+            pdf.cell(widths[idx], TABLE_ROW_HEIGHT, text, border="T", ln=0, align="R" if key in values else "L")
+        pdf.ln(TABLE_ROW_HEIGHT)
+        pdf.set_font("Arial", size=8)
+
+    def start_page():
+        pdf.add_page()
+        pdf.set_font("Arial", style="B", size=12)
+        pdf.cell(0, 8, report_title if page_number == 1 else f"{report_title} (continued)", ln=True, align="C")
+        pdf.set_font("Arial", style="B", size=8)
+        for idx, (header, key, kind) in enumerate(columns):
+            pdf.cell(widths[idx], TABLE_ROW_HEIGHT, header, border="B", ln=0, align="R" if kind == "money" else "L")
+        pdf.ln(TABLE_ROW_HEIGHT)
+        pdf.set_font("Arial", size=8)
+
+    page_number += 1
+    start_page()
+    for record in chain(sample, records):
+        if pdf.get_y() + TABLE_ROW_HEIGHT > bottom:
+            if total_columns:
+                totals_row(f"Page {page_number} total", page_totals)
+                page_totals = {key: 0.0 for key in total_columns}
+            page_number += 1
+            start_page()
+        for idx, (header, key, kind) in enumerate(columns):
+            text = cell_text(record, key, kind)
+            if len(text) > max_chars[idx]:
+                text = text[:max_chars[idx] - 1] + "~"
+            pdf.cell(widths[idx], TABLE_ROW_HEIGHT, text, ln=0, align="R" if kind == "money" else "L")
+        pdf.ln(TABLE_ROW_HEIGHT)
+        for key in total_columns:
+            amount = to_float(record.get(key))
+            page_totals[key] += amount
+            totals[key] += amount
+
+    if total_columns:
+        totals_row(f"Page {page_number} total", page_totals)
+        totals_row("Grand total", totals)
+    if summary_lines:
+        pdf.ln(TABLE_ROW_HEIGHT)
+        pdf.set_font("Arial", size=10)
+        for line in summary_lines:
+            if pdf.get_y() + 6 > pdf.h - 10:
+                pdf.add_page()
+            pdf.cell(0, 6, line.strip(), ln=True)
+    return pdf_bytes(pdf)
+
+def main_menu(session):
+    """Return the screen the user picked, or SIGN_OUT."""
+    screens = {
+        "1": add_inventory,
+        "2": update_inventory,
+        "3": add_expenditure,
+        "4": print_reports,
+        "5": sell_car,
+        "6": view_inventory,
+        "7": partial(view_inventory, show_all=True),
+        "8": import_inventory,
+        "9": search_inventory,
+    }
     while True:
         clear_console()
-        print(f"\nWelcome {username}")
+        print(f"\nWelcome {session['username']}")
         print("What would you like to do?:")
         print("1. Add Inventory")
         print("2. Update Inventory")
@@ -501,37 +2962,561 @@ def main_menu(username):
         print("5. Sold Cars")
         print("6. View Current Inventory")
         print("7. View All Inventory")
-        print("8. Import Inventory from Excel")
-        print("9. Sign Out")  # Changed exit to sign out
+        print("8. Import Inventory from Excel or CSV")
+        print("9. Search Inventory")
+        print("10. Sign Out")  # Changed exit to sign out
 
         choice = input("Enter your choice: ")
 
-        if choice == "1":
-            add_inventory()
-        elif choice == "2":
-            update_inventory()
-        elif choice == "3":
-            add_expenditure()
-        elif choice == "4":
-            print_reports()
-        elif choice == "5":
-            sell_car()
-        elif choice == "6":
-            view_inventory()
-        elif choice == "7":
-            view_inventory(show_all=True)
-        elif choice == "8":
-            import_inventory()
-        elif choice == "9":
+        if choice in screens:
+            return screens[choice]
+        elif choice == "10":
             show_transition("Signing out...")
-            save_data()  # Save data before signing out
-            user_login()
-            break
+            compact_data()  # Fold the journal into the workbooks before signing out
+            return SIGN_OUT
         else:
             print("Invalid choice. Please try again.")
 
+# Command line
+UPDATABLE_FIELDS = {"name": "Name", "model": "Model", "type": "Type", "year": "Year",
+                    "mileage": "Mileage", "faults": "Faults", "price": "Price"}
+
+def find_one_car(vin, unsold_only=False, archived=False):
+    """VIN lookup for scripted use, where an unknown or ambiguous VIN is an error rather than a prompt."""
+    matches = find_cars(vin, unsold_only)
+    if not matches and archived:
+        matches = find_archived_cars(vin)
+    if not matches:
+        raise ValueError(f"no {'unsold ' if unsold_only else ''}vehicle with VIN {vin}")
+    if len(matches) > 1:
+        raise ValueError(f"VIN {vin} matches {len(matches)} vehicles; use the full VIN")
+    return matches[0]
+
+def coerce_field(field, value):
+    if field == "Price":
+        return float(value)
+    if field == "Faults":
+        return normalize_faults(value)
+    return str(value)
+
+def apply_operation(operation):
+    """Apply one scripted operation: add, update, sell or expense.
+
+    Keys are case-insensitive and empty values are ignored, so rows from a CSV batch
+    file and dicts from a JSON one both work.
+    """
+    op = {str(key).strip().lower(): value for key, value in operation.items()
+          if value is not None and value == value and value != ""}
+    kind = str(op.get("op", "")).strip().lower()
+    try:
+        if kind == "add":
+            return add_vehicle(str(op.get("stock_number", "")), str(op.get("name", "")), str(op.get("model", "")),
+                               str(op.get("type", "")), str(op["vin"]), str(op.get("year", "")),
+                               str(op.get("mileage", "")), normalize_faults(op.get("faults", [])), float(op["price"]))
+        if kind == "update":
+            car = find_one_car(op["vin"])
+            fields = op.get("fields") or {UPDATABLE_FIELDS[key]: value for key, value in op.items() if key in UPDATABLE_FIELDS}
+            unknown = [field for field in fields if str(field).strip().lower() not in UPDATABLE_FIELDS]
+            if unknown:
+                raise ValueError(f"cannot update {', '.join(map(str, unknown))}; "
+                                 f"fields are {', '.join(UPDATABLE_FIELDS.values())}")
+            changes = {UPDATABLE_FIELDS[str(field).strip().lower()]: value for field, value in fields.items()}
+            if not changes:
+                raise ValueError("nothing to update")
+            update_vehicle(car, {field: coerce_field(field, value) for field, value in changes.items()})
+            return car
+        if kind == "sell":
+            return sell_vehicle(find_one_car(op["vin"], unsold_only=True), float(op["price"]))
+        if kind == "expense":
+            car = find_one_car(op["vin"]) if "vin" in op else None
+            return record_expenditure(float(op["amount"]), str(op.get("description", "")), car)
+    except KeyError as e:
+        raise ValueError(f"missing '{e.args[0]}'") from None
+    raise ValueError(f"unknown operation '{kind}'")
+
+def read_batch_file(path):
+    """Read operations from a JSON list (or {"operations": [...]}) or a CSV file with an 'op' column."""
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path, dtype=str, keep_default_na=False).to_dict('records')
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["operations"] if isinstance(data, dict) else data
+
+def run_operations(operations):
+    """Apply operations in order and persist them as one commit.
+
+    Failed operations are skipped and reported; the rest are still applied.
+    Returns the number applied and a list of (operation number, error).
+    """
+    applied, errors = 0, []
+    with batch_changes():
+        for number, operation in enumerate(operations, start=1):
+            try:
+                apply_operation(operation)
+                applied += 1
+            except (ValueError, TypeError) as e:
+                errors.append((number, str(e)))
+    return applied, errors
+
+def print_report(kind, vin=None, show_all=False, pdf=False):
+    """Print a report without paging or prompts."""
+    if kind == "inventory":
+        cars = current_inventory(show_all)
+        key = report_key("inventory", show_all, "inventory")
+        text = cached_report(key + ("text",), lambda: "\n".join(format_car(idx, car) for idx, car in enumerate(cars, start=1)))
+        if text:
+            print(text)
+        if pdf:
+            write_table_pdf("Inventory Report", INVENTORY_COLUMNS, current_inventory(show_all), "inventory_report.pdf",
+                            total_columns=("Price",), cache_key=key)
+    elif kind == "sales":
+        refresh_data()
+        key = report_key("sales", None, "sold_cars")
+        report_content = cached_report(key, sales_report_lines)
+        print("".join(report_content))
+        if pdf:
+            write_table_pdf("Sales Summary Report", SALES_COLUMNS, current_sold_cars(), "sales_summary_report.pdf",
+                            total_columns=("SalesPrice", "Tax", "Profit"), summary_lines=report_content, cache_key=key)
+    elif kind == "expenditures":
+        key = report_key("expenditures", None, "expenditures")
+        if expenditures:
+            print(cached_report(key, expenditure_report_text))
+        if pdf:
+            write_table_pdf("Expenditure Report", EXPENDITURE_COLUMNS, expenditures, "expenditure_report.pdf",
+                            total_columns=("Amount",), cache_key=key)
+    elif kind == "faults":
+        refresh_data()
+        key = report_key("faults", not show_all, "inventory")
+        report_content = cached_report(key, partial(fault_report_lines, unsold_only=not show_all))
+        print("".join(report_content))
+        if pdf:
+            save_report_to_pdf("Fault Counts", report_content, "fault_report.pdf", cache_key=key)
+    elif kind == "vin":
+        car = find_one_car(vin or "", archived=True)
+        key = vin_report_key(vin, car)
+        report_content = cached_report(key, partial(vin_report_lines, car))
+        print("".join(report_content))
+        if pdf:
+            save_report_to_pdf(f"Report for VIN {vin}", report_content, "vin_report.pdf", cache_key=key)
+
+# End-of-day reports
+def eod_jobs(day):
+    """Snapshot what the end-of-day PDFs need as (filename, renderer, arguments) jobs.
+
+    Rows are copied to plain dicts holding only the report columns, so the jobs are
+    consistent with each other, cheap to pickle and independent of later edits.
+    """
+    def rows(records, columns):
+        return [{key: record.get(key) for _, key, _ in columns} for record in records]
+
+    jobs = [
+        ("inventory_report.pdf", "table",
+         ("Inventory Report", INVENTORY_COLUMNS, rows(current_inventory(), INVENTORY_COLUMNS), ("Price",))),
+        ("sales_summary_report.pdf", "table",
+         ("Sales Summary Report", SALES_COLUMNS, rows(current_sold_cars(), SALES_COLUMNS),
+          ("SalesPrice", "Tax", "Profit"), sales_report_lines())),
+        ("expenditure_report.pdf", "table",
+         ("Expenditure Report", EXPENDITURE_COLUMNS, rows(expenditures, EXPENDITURE_COLUMNS), ("Amount",))),
+    ]
+    filenames = set()
+    for sale in sold_cars:
+        if str(sale.get("SaleDate") or "")[:10] != day:
+            continue
+        vin = str(sale.get("VIN") or "")
+        filename = f"vin_{re.sub(r'[^A-Za-z0-9]', '_', vin)}.pdf"
+        if filename in filenames:  # The same car sold twice in a day
+            filename = f"vin_{re.sub(r'[^A-Za-z0-9]', '_', vin)}_{len(filenames)}.pdf"
+        filenames.add(filename)
+        content = vin_report_lines(sale) + [
+            f"\nSale Price: ${to_float(sale.get('SalesPrice')):.2f}\n",
+            f"Tax: ${to_float(sale.get('Tax')):.2f}\n",
+            f"Profit: ${to_float(sale.get('Profit')):.2f}\n",
+            f"Sale Date: {sale.get('SaleDate')}",
+        ]
+        jobs.append((filename, "text", (f"Report for VIN {vin}", content)))
+    return jobs
+
+def render_eod_report(directory, job):
+    """Render one end-of-day PDF into directory. Runs in a worker process, so it must stay top-level."""
+    filename, renderer, render_args = job
+    started = time.perf_counter()
+    data = render_table_pdf(*render_args) if renderer == "table" else render_text_pdf(*render_args)
+    write_file_atomic(os.path.join(directory, filename), data)
+    return {"file": filename, "seconds": time.perf_counter() - started, "bytes": len(data), "pid": os.getpid()}
+
+def run_end_of_day(day=None, output_dir="reports", workers=None):
+    """Render the end-of-day PDFs in parallel into output_dir/day and write a manifest. Returns the exit status."""
+    day = day or datetime.now().strftime("%Y-%m-%d")
+    try:
+        datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        print(f"Error: invalid date {day}; use YYYY-MM-DD")
+        return 1
+    refresh_data()
+    jobs = eod_jobs(day)
+    # Biggest reports first, so a large inventory report is not the last thing started
+    jobs.sort(key=lambda job: -len(job[2][2]) if job[1] == "table" else 0)
+    directory = os.path.join(output_dir, day)
+    os.makedirs(directory, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+
+    started = time.perf_counter()
+    reports = []
+    if workers == 1:
+        for job in jobs:
+            reports.append(render_eod_report(directory, job))
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(render_eod_report, directory, job): job[0] for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    reports.append(future.result())
+                except Exception as e:
+                    reports.append({"file": futures[future], "error": str(e)})
+    wall = time.perf_counter() - started
+
+    reports.sort(key=lambda report: report["file"])
+    manifest = {"date": day, "workers": workers, "wall_s": wall, "reports": reports}
+    write_file_atomic(os.path.join(directory, "manifest.json"), json.dumps(manifest, indent=2).encode("utf-8"))
+
+    print(f"End-of-day reports for {day} in {directory}")
+    print(f"  {'File':<40}{'Seconds':>9}{'Bytes':>11}{'Worker':>9}")
+    for report in reports:
+        if "error" in report:
+            print(f"  {report['file']:<40}  failed: {report['error']}")
+        else:
+            print(f"  {report['file']:<40}{report['seconds']:>9.2f}{report['bytes']:>11}{report['pid']:>9}")
+    print(f"{len(reports)} reports in {wall:.2f}s using {workers} worker{'s' if workers != 1 else ''}.")
+    return 1 if any("error" in report for report in reports) else 0
+
+# Server
+def check_change(entry):
+    """Refuse a client's change that no longer fits the data, e.g. selling a car someone else just sold."""
+    op = entry.get("op")
+    if op == "sell_car":
+        if not any(not car.get("Sold", False) for car in vin_index.get(vin_key(entry["VIN"]), [])):
+            raise ValueError(f"VIN {entry['VIN']} is not in stock; it may just have been sold")
+    elif op == "update_car":
+        if not vin_index.get(vin_key(entry["VIN"])):
+            raise ValueError(f"no vehicle with VIN {entry['VIN']}")
+    elif op == "add_user":
+        if entry["Username"] in users:
+            raise ValueError(f"username {entry['Username']} already exists")
+    elif op not in CHANGE_DATASETS:
+        raise ValueError(f"unknown change '{op}'")
+
+@instrumented
+def serve_commit(changes):
+    """Apply and persist a client's changes as one commit, or none of them. Returns their change numbers."""
+    global server_seq
+    if not isinstance(changes, list) or not all(isinstance(entry, dict) for entry in changes):
+        raise ValueError("changes must be a list of JSON objects")
+    applied = 0
+    try:
+        for entry in changes:
+            check_change(entry)
+            apply_change(entry)
+            if entry["op"] == "sell_car":
+                record_sale_aggregates(sold_cars[-1])
+            applied += 1
+    except (ValueError, KeyError) as e:
+        if applied:
+            load_data()  # Back out the part of the batch already applied; none of it was persisted
+        raise ValueError(f"missing '{e.args[0]}'" if isinstance(e, KeyError) else str(e)) from None
+    try:
+        with batch_changes():
+            for entry in changes:
+                commit_change(entry["op"], **{key: value for key, value in entry.items() if key not in ("op", "seq")})
+    except OSError as e:
+        # Back out to what is stored. Part of the commit may have reached disk, so clients
+        # cannot catch up from the log either; send them all a fresh snapshot
+        load_data()
+        server_seq += 1
+        server_log.clear()
+        raise ValueError(f"the server could not save the changes: {e}") from None
+    seqs = []
+    for entry in changes:
+        server_seq += 1
+        server_log.append((server_seq, json.dumps({**entry, "seq": server_seq}, default=_json_default)))
+        seqs.append(server_seq)
+    return seqs
+
+def serve_request(request):
+    """Answer one client request with a JSON line."""
+    global server_seq, server_snapshot
+    if not isinstance(request, dict):
+        raise ValueError("a request must be a JSON object")
+    op = request.get("op")
+    if op == "snapshot":
+        if server_snapshot[0] != server_seq:
+            response = {"ok": True, "seq": server_seq, "inventory": inventory, "sold_cars": sold_cars, "users": users,
+                        "expenditures": expenditures, "sales_aggregates": sales_aggregates}
+            server_snapshot = (server_seq, json.dumps(response, default=_json_default).encode("utf-8") + b"\n")
+        return server_snapshot[1]
+    if op == "changes":
+        since = int(request["since"])
+        if since == server_seq:
+            return b'{"ok": true, "changes": []}\n'
+        if since > server_seq or not server_log or since < server_log[0][0] - 1:
+            return b'{"ok": true, "reload": true}\n'
+        changes = ",".join(text for seq, text in server_log if seq > since)
+        return f'{{"ok": true, "changes": [{changes}]}}\n'.encode("utf-8")
+    if op == "commit":
+        response = {"ok": True, "seqs": serve_commit(request["changes"])}
+    elif op == "users":
+        response = {"ok": True, "users": users}
+    elif op == "archive":
+        sales, spend = archive_data(int(request["days"]))
+        if sales or spend:
+            server_seq += 1  # Clients cannot replay an archive run, so send them all a fresh snapshot
+            server_log.clear()
+        response = {"ok": True, "sales": sales, "expenditures": spend}
+    else:
+        raise ValueError(f"unknown request '{op}'")
+    return json.dumps(response, default=_json_default).encode("utf-8") + b"\n"
+
+async def serve_client(reader, writer):
+    """Answer one client's requests in order until it disconnects.
+
+    Requests are handled on the event loop without awaiting in between, so every change
+    from every client is applied and persisted one at a time, in the order received.
+    """
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                reply = serve_request(json.loads(line))
+            except (ValueError, KeyError, TypeError) as e:
+                reply = json.dumps({"ok": False, "error": str(e)}).encode("utf-8") + b"\n"
+            writer.write(reply)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+def run_server(address=SERVER_ADDRESS):
+    """Own the data and serve it to clients started with --connect until interrupted."""
+    import asyncio
+    import signal
+    host, port = parse_address(address)
+    load_data()
+
+    async def main():
+        server = await asyncio.start_server(serve_client, host, port, limit=SERVER_MAX_REQUEST)
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, server.close)
+            except (NotImplementedError, AttributeError):
+                pass  # Windows; Ctrl+C still raises KeyboardInterrupt
+        print(f"Serving {len(inventory)} vehicles on {host}:{port}. Press Ctrl+C to stop.", flush=True)
+        async with server:
+            try:
+                await server.serve_forever()
+            except asyncio.CancelledError:
+                pass  # Closed by a signal
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        compact_data()  # Fold the journal into the workbooks before exiting
+    print("Server stopped.")
+
+def run_command(args):
+    """Run a non-interactive subcommand. Returns the process exit status."""
+    if storage.name == "remote" and args.command == "migrate":
+        print(f"Error: {args.command} works on the data files directly; run it without --connect")
+        return 1
+    if args.command == "migrate":
+        migrate_storage(args.source, args.target)
+        return 0
+    if args.command == "serve":
+        run_server(args.address)
+        return 0
+
+    load_data()
+    if args.command == "import":
+        try:
+            result = import_vehicles(args.file)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            return 1
+        print_import_result(result)
+        return 0
+    if args.command == "search":
+        try:
+            query = build_query(args.type, args.model, args.name, parse_range(args.year or ""),
+                                parse_range(args.mileage or ""), parse_range(args.price or ""), args.sold, args.fault)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+        if args.sort:
+            query.order_by(args.sort, args.desc)
+        matches = query.cars()
+        for idx, car in enumerate(matches[:args.limit] if args.limit else matches, start=1):
+            print(format_car(idx, car, indent="   "))
+        print(f"{len(matches)} vehicles match.")
+        return 0
+    if args.command == "archive":
+        if storage.name == "remote":
+            result = storage.request("archive", days=args.days)
+            load_data()
+            sales, spend = result["sales"], result["expenditures"]
+        else:
+            sales, spend = archive_data(args.days)
+        print(f"Archived {sales} sales and {spend} expenditures older than {args.days} days into {ARCHIVE_DIR}/; "
+              f"{len(inventory)} vehicles, {len(sold_cars)} sales and {len(expenditures)} expenditures remain.")
+        return 0
+    if args.command == "eod":
+        return run_end_of_day(args.date, args.output_dir, args.workers)
+    if args.command == "report":
+        try:
+            print_report(args.kind, args.vin, args.all, args.pdf)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+        return 0
+
+    try:
+        if args.command == "batch":
+            operations = read_batch_file(args.file)
+        elif args.command == "update":
+            malformed = [item for item in args.set if "=" not in item]
+            if malformed:
+                raise ValueError(f"--set {malformed[0]} is not FIELD=VALUE")
+            fields = dict(item.split("=", 1) for item in args.set)
+            operations = [{"op": "update", "vin": args.vin, "fields": fields}]
+        else:
+            operations = [{"op": args.command, **{key: value for key, value in vars(args).items() if key != "command"}}]
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    try:
+        applied, errors = run_operations(operations)
+    except ServerError as e:
+        print(f"Error: the server refused the changes: {e}")
+        return 1
+    for number, error in errors:
+        print(f"Operation {number}: {error}")
+    print(f"Applied {applied} of {len(operations)} operations.")
+    return 1 if errors else 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Car inventory management. Run without a command for the interactive menus.")
+    parser.add_argument("--startup-timing", action="store_true",
+                        help="Show how long each startup step took after logging in")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time the data, report and PDF functions and print a summary at sign-out")
+    parser.add_argument("--profile-output", metavar="FILE",
+                        help="Write the profile summary to FILE as JSON instead of printing it (implies --profile)")
+    parser.add_argument("--cprofile", metavar="FILE",
+                        help="Capture a cProfile of the whole session (main thread) to FILE")
+    parser.add_argument("--connect", metavar="HOST:PORT", nargs="?", const=SERVER_ADDRESS,
+                        help=f"Work against a running inventory server (default {SERVER_ADDRESS}) instead of the files")
+    subparsers = parser.add_subparsers(dest="command")
+
+    migrate_parser = subparsers.add_parser("migrate", help="Convert the stored data to another storage engine")
+    migrate_parser.add_argument("--from", dest="source", choices=sorted(STORAGE_ENGINES), default="excel")
+    migrate_parser.add_argument("--to", dest="target", choices=sorted(STORAGE_ENGINES), default="sqlite")
+
+    add_parser = subparsers.add_parser("add", help="Add a vehicle")
+    add_parser.add_argument("--vin", required=True)
+    add_parser.add_argument("--price", required=True, type=float)
+    add_parser.add_argument("--stock-number", dest="stock_number", default="")
+    for name in ("name", "model", "type", "year", "mileage"):
+        add_parser.add_argument(f"--{name}", default="")
+    add_parser.add_argument("--faults", default="", help="Comma-separated list of faults")
+
+    update_parser = subparsers.add_parser("update", help="Update fields of a vehicle")
+    update_parser.add_argument("--vin", required=True)
+    update_parser.add_argument("--set", action="append", required=True, metavar="FIELD=VALUE",
+                               help="Field to change, e.g. --set Mileage=42000 (repeatable)")
+
+    sell_parser = subparsers.add_parser("sell", help="Mark a vehicle as sold")
+    sell_parser.add_argument("--vin", required=True)
+    sell_parser.add_argument("--price", required=True, type=float, help="Sales price")
+
+    expense_parser = subparsers.add_parser("expense", help="Record an expenditure (for a car when --vin is given)")
+    expense_parser.add_argument("--vin")
+    expense_parser.add_argument("--amount", required=True, type=float)
+    expense_parser.add_argument("--description", default="")
+
+    import_parser = subparsers.add_parser("import", help="Import vehicles from an .xlsx or .csv file")
+    import_parser.add_argument("file")
+
+    report_parser = subparsers.add_parser("report", help="Print a report")
+    report_parser.add_argument("kind", choices=["inventory", "sales", "expenditures", "vin", "faults"])
+    report_parser.add_argument("--vin", help="VIN for the vin report")
+    report_parser.add_argument("--all", action="store_true", help="Include sold cars in the inventory and fault reports")
+    report_parser.add_argument("--pdf", action="store_true", help="Also save the report as a PDF")
+
+    serve_parser = subparsers.add_parser("serve", help="Own the data and serve it to clients started with --connect")
+    serve_parser.add_argument("--address", default=SERVER_ADDRESS, metavar="HOST:PORT",
+                              help=f"Address to listen on (default {SERVER_ADDRESS}); there is no authentication")
+
+    archive_parser = subparsers.add_parser("archive", help="Move old sales and settled expenditures into monthly archives")
+    archive_parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                                help=f"Archive sales older than this many days (default: {ARCHIVE_AFTER_DAYS})")
+
+    eod_parser = subparsers.add_parser("eod", help="Render the end-of-day PDF reports in parallel")
+    eod_parser.add_argument("--date", help="Day whose sales get VIN reports, YYYY-MM-DD (default: today)")
+    eod_parser.add_argument("--output-dir", default="reports", help="Reports go in a folder per day under this one")
+    eod_parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU core)")
+
+    search_parser = subparsers.add_parser("search", help="Find vehicles by type, model, name, year, mileage, price and status")
+    search_parser.add_argument("--type", action="append", default=[], help="Vehicle type (repeatable; any may match)")
+    search_parser.add_argument("--model", action="append", default=[], help="Model (repeatable)")
+    search_parser.add_argument("--name", action="append", default=[], help="Name (repeatable)")
+    search_parser.add_argument("--year", help="Year or range, e.g. 2018-2021")
+    search_parser.add_argument("--mileage", help="Mileage range, e.g. -80000 for at most 80,000")
+    search_parser.add_argument("--price", help="Price range, e.g. 5000-20000")
+    search_parser.add_argument("--fault", action="append", default=[],
+                               help="Fault or word of one, e.g. transmission (repeatable; any may match)")
+    status = search_parser.add_mutually_exclusive_group()
+    status.add_argument("--unsold", dest="sold", action="store_false", default=None, help="Only unsold vehicles")
+    status.add_argument("--sold", dest="sold", action="store_true", help="Only sold vehicles")
+    search_parser.add_argument("--sort", choices=SORT_KEYS, help="Sort the results by this column")
+    search_parser.add_argument("--desc", action="store_true", help="Sort in descending order")
+    search_parser.add_argument("--limit", type=int, help="Show at most this many results")
+
+    batch_parser = subparsers.add_parser("batch", help="Apply add/update/sell/expense operations from a JSON or CSV file")
+    batch_parser.add_argument("file")
+    return parser
+
 # Start the program
 if __name__ == "__main__":
-    load_data()
-    user_login()
-    main_menu("User  ")  # Enter the main menu with a default username
+    from multiprocessing import freeze_support
+    freeze_support()  # Lets the eod worker processes start in the frozen (PyInstaller) build
+    args = build_parser().parse_args()
+    connect = args.connect or os.environ.get("INVENTORY_SERVER")
+    if connect and args.command != "serve":
+        storage = RemoteStorage(connect)
+    if args.profile or args.profile_output or os.environ.get("INVENTORY_PROFILE"):
+        enable_profiling(args.profile_output)
+    profiler = None
+    if args.cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    status = 0
+    try:
+        if args.command:
+            status = run_command(args)
+            if profiling:
+                report_profile()
+        else:
+            run_interactive(show_timings=args.startup_timing or bool(os.environ.get("INVENTORY_STARTUP_TIMING")))
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            print(f"cProfile data written to {args.cprofile} (view with: python -m pstats {args.cprofile})")
+    raise SystemExit(status)
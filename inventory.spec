@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['pandas', 'openpyxl'],  # pandas is imported lazily by name, which the analysis cannot see
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
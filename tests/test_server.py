@@ -0,0 +1,132 @@
+"""Server mode, end to end on localhost: a real `serve` process and `--connect` clients."""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+INVENTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "inventory.py")
+VIN = "1HGCM82633A004352"
+
+sys.path.insert(0, os.path.dirname(INVENTORY))
+import inventory as inv
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.address = f"127.0.0.1:{free_port()}"
+        self.server = subprocess.Popen([sys.executable, INVENTORY, "serve", "--address", self.address],
+                                       cwd=self.tmp.name, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        host, port = self.address.split(":")
+        deadline = time.time() + 60
+        while True:
+            try:
+                socket.create_connection((host, int(port)), timeout=1).close()
+                break
+            except OSError:
+                if time.time() > deadline or self.server.poll() is not None:
+                    self.fail(f"server did not start: {self.server.stdout.read()}")
+                time.sleep(0.2)
+
+    def tearDown(self):
+        if self.server.poll() is None:
+            self.server.kill()
+            self.server.wait()
+        self.server.stdout.close()
+        self.tmp.cleanup()
+
+    def run_cli(self, *args, connect=True):
+        command = [sys.executable, INVENTORY] + (["--connect", self.address] if connect else []) + list(args)
+        return subprocess.run(command, cwd=self.tmp.name, capture_output=True, text=True, timeout=120)
+
+    def write_batch(self, operations):
+        path = os.path.join(self.tmp.name, "ops.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(operations, f)
+        return path
+
+    def test_mixed_batch_is_committed_and_persisted(self):
+        batch = self.write_batch([
+            {"op": "add", "vin": VIN, "price": 9500, "name": "Honda", "model": "Civic"},
+            {"op": "expense", "vin": VIN, "amount": 250, "description": "New tires"},
+            {"op": "update", "vin": VIN, "fields": {"Mileage": "42,000"}},
+            {"op": "sell", "vin": VIN, "price": 12500},
+        ])
+        result = self.run_cli("batch", batch)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        self.assertIn("Applied 4 of 4 operations.", result.stdout)
+
+        report = self.run_cli("report", "vin", "--vin", VIN)
+        self.assertIn("Sold: True", report.stdout)
+        self.assertIn("Mileage: 42000", report.stdout)
+
+        # The car is gone from stock for every client now
+        again = self.run_cli("sell", "--vin", VIN, "--price", "1")
+        self.assertEqual(again.returncode, 1)
+
+        self.server.send_signal(signal.SIGTERM)
+        self.server.wait(timeout=60)
+        on_disk = self.run_cli("report", "sales", connect=False)
+        self.assertIn("Cars Sold: 1", on_disk.stdout)
+        inventory = self.run_cli("report", "inventory", "--all", connect=False)
+        self.assertEqual(inventory.stdout.count(f"VIN: {VIN}"), 1)
+
+    def test_non_object_request_gets_an_error_reply(self):
+        host, port = self.address.split(":")
+        with socket.create_connection((host, int(port)), timeout=30) as sock:
+            stream = sock.makefile("rwb")
+            stream.write(b"[]\n")
+            stream.flush()
+            self.assertFalse(json.loads(stream.readline())["ok"])
+            stream.write(b'{"op": "users"}\n')  # The connection is still served
+            stream.flush()
+            self.assertTrue(json.loads(stream.readline())["ok"])
+
+
+class ServeCommitTest(unittest.TestCase):
+    """serve_commit in-process, so a storage failure can be injected."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        inv.storage = inv.ExcelStorage()
+        inv.server_seq = 0
+        inv.server_log.clear()
+        inv.load_data()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def add_car(self, vin):
+        return {"op": "commit", "changes": [{"op": "add_car", "car": {"VIN": vin, "Price": 1000.0, "Sold": False}}]}
+
+    def test_unsaved_commit_is_backed_out(self):
+        inv.serve_request(self.add_car(VIN))
+        with mock.patch.object(inv.storage, "commit", side_effect=OSError("fsync failed")):
+            with self.assertRaisesRegex(ValueError, "could not save"):
+                inv.serve_request(self.add_car("2HGFG12345H123456"))
+        self.assertEqual([car["VIN"] for car in inv.inventory], [VIN])
+        self.assertIn(b'"reload": true', inv.serve_request({"op": "changes", "since": 1}))
+
+    def test_non_object_changes_are_refused(self):
+        with self.assertRaises(ValueError):
+            inv.serve_request({"op": "commit", "changes": [[]]})
+        self.assertEqual(inv.inventory, [])
+
+
+if __name__ == "__main__":
+    unittest.main()